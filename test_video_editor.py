@@ -1,13 +1,20 @@
 import unittest
 import os
+import sys
+import json
 import tempfile
 import subprocess
+from unittest import mock
+import video_editor_script
 from video_editor_script import (
     PanDirection, EasingType, ASPECT_RATIOS,
     create_video_segment, get_video_duration,
     get_video_dimensions, create_video_montage,
     determine_scaling_filter, test_filter_string,
-    validate_inputs, TextMotionType
+    validate_inputs, TextMotionType, create_ffmpeg_command,
+    run_ffmpeg, build_parser, batch_job_argv, PROBE_LIMIT_ARGS,
+    get_concat_input_args, create_concat_file, can_stream_copy_together,
+    build_segment_group_command, group_segment_jobs, build_segment_filter
 )
 
 class TestVideoEditor(unittest.TestCase):
@@ -121,6 +128,19 @@ class TestVideoEditor(unittest.TestCase):
                 duration = get_video_duration(result)
                 self.assertAlmostEqual(duration, 3.0, delta=0.1)
 
+    def test_ffmpeg_command_input_seek(self):
+        """Test that the start time is placed before the input for fast seeking."""
+        cmd = create_ffmpeg_command(
+            input_file=self.test_video,
+            output_file=os.path.join(self.temp_dir, 'test_seek.mp4'),
+            vf_filter='scale=1080:1920',
+            duration=3,
+            start_time=5,
+        )
+        self.assertIn('-ss', cmd)
+        self.assertLess(cmd.index('-ss'), cmd.index('-i'))
+        self.assertEqual(cmd[cmd.index('-ss') + 1], '5')
+
     def test_filter_string_validation(self):
         """Test filter string validation."""
         # Test valid filter
@@ -397,5 +417,493 @@ class TestVideoEditor(unittest.TestCase):
             actual_duration = get_video_duration(result)
             self.assertAlmostEqual(actual_duration, 1.0, delta=0.1)
 
+# Stand-in for ffmpeg: the last argument picks what it does, and the
+# arguments it was given are written to stderr
+FAKE_FFMPEG = f"""#!{sys.executable}
+import json, sys, time
+sys.stderr.write(json.dumps(sys.argv[1:]))
+if sys.argv[-1] == "sleep":
+    time.sleep(30)
+"""
+
+class TestRunFfmpeg(unittest.TestCase):
+    """Watchdog tests for run_ffmpeg that run without ffmpeg installed."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.mkdtemp(prefix='video_editor_test_')
+        cls.fake_ffmpeg = os.path.join(cls.temp_dir, 'ffmpeg')
+        with open(cls.fake_ffmpeg, 'w') as f:
+            f.write(FAKE_FFMPEG)
+        os.chmod(cls.fake_ffmpeg, 0o755)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.fake_ffmpeg)
+        os.rmdir(cls.temp_dir)
+
+    def setUp(self):
+        self.stall_timeout = video_editor_script.FFMPEG_STALL_TIMEOUT
+        self.timeout = video_editor_script.FFMPEG_TIMEOUT
+
+    def tearDown(self):
+        video_editor_script.FFMPEG_STALL_TIMEOUT = self.stall_timeout
+        video_editor_script.FFMPEG_TIMEOUT = self.timeout
+
+    def test_progress_pipe_inserted(self):
+        """-progress pipe:1 goes right after the executable."""
+        result = run_ffmpeg([self.fake_ffmpeg, '-i', 'in.mp4', 'out.mp4'])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(
+            json.loads(result.stderr),
+            ['-progress', 'pipe:1', '-i', 'in.mp4', 'out.mp4']
+        )
+
+    def test_stall_is_killed(self):
+        """A run with no progress output is killed after the stall timeout."""
+        video_editor_script.FFMPEG_STALL_TIMEOUT = 1
+        result, stalled = video_editor_script._run_ffmpeg_watched(
+            [self.fake_ffmpeg, 'sleep']
+        )
+        self.assertTrue(stalled)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ffmpeg stalled and was killed', result.stderr)
+
+    def test_hard_timeout(self):
+        """The overall timeout kills a run and is not reported as a stall."""
+        video_editor_script.FFMPEG_STALL_TIMEOUT = None
+        video_editor_script.FFMPEG_TIMEOUT = 1
+        result, stalled = video_editor_script._run_ffmpeg_watched(
+            [self.fake_ffmpeg, 'sleep']
+        )
+        self.assertFalse(stalled)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn('ffmpeg timed out and was killed', result.stderr)
+
+    def test_stalled_x264_retried_ultrafast(self):
+        """A stalled libx264 encode is rerun once with preset ultrafast."""
+        cmd = ['ffmpeg', '-i', 'in.mp4', '-c:v', 'libx264',
+               '-preset', 'slow', 'out.mp4']
+        stalled = (subprocess.CompletedProcess(cmd, -9, '', ''), True)
+        done = (subprocess.CompletedProcess(cmd, 0, '', ''), False)
+        with mock.patch.object(
+            video_editor_script, '_run_ffmpeg_watched', side_effect=[stalled, done]
+        ) as watched:
+            result = run_ffmpeg(cmd)
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(watched.call_count, 2)
+        self.assertEqual(watched.call_args_list[0].args[0], cmd)
+        self.assertEqual(
+            watched.call_args_list[1].args[0],
+            ['ffmpeg', '-i', 'in.mp4', '-c:v', 'libx264',
+             '-preset', 'ultrafast', 'out.mp4']
+        )
+
+    def test_stalled_copy_not_retried(self):
+        """Runs that are not libx264 encodes are not retried."""
+        cmd = ['ffmpeg', '-i', 'in.mp4', '-c', 'copy', 'out.mp4']
+        stalled = (subprocess.CompletedProcess(cmd, -9, '', ''), True)
+        with mock.patch.object(
+            video_editor_script, '_run_ffmpeg_watched', return_value=stalled
+        ) as watched:
+            result = run_ffmpeg(cmd)
+        self.assertEqual(result.returncode, -9)
+        self.assertEqual(watched.call_count, 1)
+
+def ffprobe_result(streams, duration='12.5'):
+    """A CompletedProcess like the one _spawn returns for ffprobe -print_format json."""
+    stdout = json.dumps({'streams': streams, 'format': {'duration': duration}})
+    return subprocess.CompletedProcess(['ffprobe'], 0, stdout, '')
+
+VIDEO_STREAM = {
+    'codec_type': 'video', 'codec_name': 'h264', 'profile': 'High',
+    'level': 40, 'pix_fmt': 'yuv420p', 'r_frame_rate': '30/1',
+    'time_base': '1/15360', 'width': 1920, 'height': 1080,
+}
+
+class TestProbeVideo(unittest.TestCase):
+    """probe_video parsing and caching with ffprobe mocked out."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp(prefix='video_editor_test_')
+        self.video = os.path.join(self.temp_dir, 'clip.mp4')
+        with open(self.video, 'wb') as f:
+            f.write(b'not really a video')
+        self.sidecar = self.video + video_editor_script.PROBE_SIDECAR_SUFFIX
+        cache = mock.patch.dict(video_editor_script._PROBE_CACHE, clear=True)
+        cache.start()
+        self.addCleanup(cache.stop)
+
+    def tearDown(self):
+        for file in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, file))
+        os.rmdir(self.temp_dir)
+
+    def probe(self, **kwargs):
+        """probe_video with a mocked ffprobe; returns (info, spawn mock)."""
+        with mock.patch.object(
+            video_editor_script, '_spawn', return_value=ffprobe_result([VIDEO_STREAM])
+        ) as spawn:
+            info = video_editor_script.probe_video(self.video, **kwargs)
+        return info, spawn
+
+    def write_sidecar(self, text=None, **changes):
+        stat = os.stat(self.video)
+        data = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'probe': {'duration': 99.0, 'width': 640, 'height': 480,
+                      'time_base': '1/90000'},
+        }
+        data.update(changes)
+        with open(self.sidecar, 'w') as f:
+            f.write(text if text is not None else json.dumps(data))
+
+    def read_sidecar(self):
+        with open(self.sidecar) as f:
+            return json.load(f)
+
+    def test_parse_video_and_audio(self):
+        audio = {'codec_type': 'audio', 'codec_name': 'aac', 'profile': 'LC',
+                 'sample_rate': '48000', 'channels': 2}
+        with mock.patch.object(
+            video_editor_script, '_spawn',
+            return_value=ffprobe_result([VIDEO_STREAM, audio])
+        ):
+            info = video_editor_script._probe_video('in.mp4')
+        self.assertEqual(info, {
+            'duration': 12.5, 'width': 1920, 'height': 1080,
+            'codec': 'h264', 'profile': 'High', 'level': 40,
+            'pix_fmt': 'yuv420p', 'frame_rate': '30/1', 'time_base': '1/15360',
+            'has_audio': True, 'audio_codec': 'aac', 'audio_profile': 'LC',
+            'sample_rate': 48000, 'channels': 2,
+        })
+
+    def test_parse_video_only(self):
+        with mock.patch.object(
+            video_editor_script, '_spawn', return_value=ffprobe_result([VIDEO_STREAM])
+        ):
+            info = video_editor_script._probe_video('in.mp4')
+        self.assertEqual((info['width'], info['height']), (1920, 1080))
+        self.assertFalse(info['has_audio'])
+        self.assertIsNone(info['audio_codec'])
+        self.assertIsNone(info['sample_rate'])
+        self.assertIsNone(info['channels'])
+
+    def test_parse_audio_only(self):
+        audio = {'codec_type': 'audio', 'codec_name': 'mp3'}
+        with mock.patch.object(
+            video_editor_script, '_spawn', return_value=ffprobe_result([audio])
+        ):
+            with self.assertRaisesRegex(ValueError, 'song.mp3: no video stream'):
+                video_editor_script._probe_video('song.mp3')
+
+    def test_memory_cache_hit(self):
+        first, spawn = self.probe()
+        self.assertEqual(spawn.call_count, 1)
+        second, spawn = self.probe()
+        spawn.assert_not_called()
+        self.assertEqual(first, second)
+
+    def test_no_sidecar_by_default(self):
+        self.probe()
+        self.assertFalse(os.path.exists(self.sidecar))
+
+    def test_sidecar_written(self):
+        info, spawn = self.probe(sidecar=True)
+        self.assertEqual(spawn.call_count, 1)
+        data = self.read_sidecar()
+        stat = os.stat(self.video)
+        self.assertEqual(data['size'], stat.st_size)
+        self.assertEqual(data['mtime_ns'], stat.st_mtime_ns)
+        self.assertEqual(data['probe'], info)
+
+    def test_fresh_sidecar_used(self):
+        self.write_sidecar()
+        info, spawn = self.probe(sidecar=True)
+        spawn.assert_not_called()
+        self.assertEqual(info['duration'], 99.0)
+
+    def test_stale_sidecar_reprobed(self):
+        for case, changes in [('size', {'size': 1}), ('mtime_ns', {'mtime_ns': 1})]:
+            with self.subTest(case=case):
+                video_editor_script._PROBE_CACHE.clear()
+                self.write_sidecar(**changes)
+                info, spawn = self.probe(sidecar=True)
+                self.assertEqual(spawn.call_count, 1)
+                self.assertEqual(info['duration'], 12.5)
+                self.assertEqual(self.read_sidecar()['probe'], info)
+
+    def test_old_sidecar_reprobed(self):
+        """Sidecars without the stream parameters are probed again."""
+        self.write_sidecar(probe={'duration': 99.0, 'width': 640, 'height': 480})
+        info, spawn = self.probe(sidecar=True)
+        self.assertEqual(spawn.call_count, 1)
+        self.assertEqual(info['codec'], 'h264')
+
+    def test_corrupt_sidecar_reprobed(self):
+        self.write_sidecar(text='{"size": ')
+        info, spawn = self.probe(sidecar=True)
+        self.assertEqual(spawn.call_count, 1)
+        self.assertEqual(self.read_sidecar()['probe'], info)
+
+    def test_probe_limit_args(self):
+        with mock.patch.object(
+            video_editor_script, '_spawn', return_value=ffprobe_result([VIDEO_STREAM])
+        ) as spawn:
+            video_editor_script._probe_video('in.mp4')
+        argv = spawn.call_args.args[0]
+        self.assertEqual(argv[0], video_editor_script.FFPROBE)
+        index = argv.index('-probesize')
+        self.assertEqual(argv[index:index + len(PROBE_LIMIT_ARGS)], PROBE_LIMIT_ARGS)
+        self.assertEqual(PROBE_LIMIT_ARGS, ['-probesize', '1000000', '-analyzeduration', '1000000'])
+        self.assertEqual(argv[-1], 'in.mp4')
+
+class TestStreamCopy(unittest.TestCase):
+    """can_stream_copy_together with probe_video mocked out."""
+
+    def setUp(self):
+        size = ASPECT_RATIOS['vertical_portrait']
+        self.info = {
+            'duration': 60.0, 'width': size['width'], 'height': size['height'],
+            'codec': 'h264', 'profile': 'High', 'level': 40,
+            'pix_fmt': 'yuv420p', 'frame_rate': '30/1', 'time_base': '1/15360',
+            'has_audio': True, 'audio_codec': 'aac', 'audio_profile': 'LC',
+            'sample_rate': 48000, 'channels': 2,
+        }
+
+    def can_copy(self, infos):
+        with mock.patch.object(
+            video_editor_script, 'probe_video', side_effect=lambda path: dict(infos[path])
+        ):
+            return can_stream_copy_together(list(infos), 'vertical_portrait')
+
+    def test_single_source(self):
+        self.assertTrue(self.can_copy({'a.mp4': self.info}))
+
+    def test_matching_sources(self):
+        self.assertTrue(self.can_copy({'a.mp4': self.info, 'b.mp4': dict(self.info)}))
+
+    def test_wrong_size_or_codec(self):
+        for key, value in [('width', 1920), ('codec', 'hevc')]:
+            with self.subTest(key=key):
+                self.assertFalse(self.can_copy({'a.mp4': dict(self.info, **{key: value})}))
+
+    def test_one_key_differs(self):
+        for key, value in [
+            ('pix_fmt', 'yuv420p10le'),
+            ('time_base', '1/90000'),
+            ('frame_rate', '25/1'),
+            ('profile', 'Main'),
+            ('has_audio', False),
+        ]:
+            with self.subTest(key=key):
+                self.assertFalse(self.can_copy({
+                    'a.mp4': self.info,
+                    'b.mp4': dict(self.info, **{key: value}),
+                }))
+
+    def test_audio_layout_is_normalized(self):
+        """Audio is re-encoded to one layout, so only its presence must match."""
+        self.assertTrue(self.can_copy({
+            'a.mp4': self.info,
+            'b.mp4': dict(self.info, channels=1, sample_rate=44100),
+        }))
+
+class TestSegmentGroups(unittest.TestCase):
+    """Multi-output segment commands, with probe_video mocked out."""
+
+    def setUp(self):
+        info = {'duration': 60.0, 'width': 1920, 'height': 1080, 'has_audio': True,
+                'audio_codec': 'aac', 'audio_profile': 'LC',
+                'sample_rate': 48000, 'channels': 2}
+        probe = mock.patch.object(
+            video_editor_script, 'probe_video', side_effect=lambda path: dict(info)
+        )
+        probe.start()
+        self.addCleanup(probe.stop)
+
+    @staticmethod
+    def job(start_time, output_file, direction=None, text_filter=None,
+            stream_copy=False, video_path='/media/a.mp4'):
+        # Same layout as the segment_jobs tuples in create_video_montage
+        return (video_path, start_time, 3.0, output_file, 'vertical_portrait',
+                direction, 2, text_filter, stream_copy)
+
+    def test_each_output_has_its_own_mapping(self):
+        jobs = [
+            self.job(5.0, '/tmp/segment_000.ts'),
+            self.job(20.0, '/tmp/segment_001.ts', direction=PanDirection.LEFT_TO_RIGHT,
+                     text_filter='drawtext=text=hi'),
+            self.job(40.0, '/tmp/segment_002.ts', stream_copy=True),
+        ]
+        cmd = build_segment_group_command(jobs, None)
+
+        # Inputs: one seeked input per job, in order
+        inputs = [i for i, arg in enumerate(cmd) if arg == '-i']
+        self.assertEqual(len(inputs), 3)
+        for start_time, position in zip([5.0, 20.0, 40.0], inputs):
+            self.assertEqual(
+                cmd[position - 4:position + 2],
+                ['-ss', str(start_time), '-t', '3.0', '-i', '/media/a.mp4']
+            )
+
+        # Outputs: split the argv after the last input at each output path
+        outputs = [job[3] for job in jobs]
+        ends = [cmd.index(path) for path in outputs]
+        self.assertEqual(ends[-1], len(cmd) - 1)
+        starts = [inputs[-1] + 2] + [end + 1 for end in ends[:-1]]
+        sections = [cmd[start:end] for start, end in zip(starts, ends)]
+
+        for k, section in enumerate(sections):
+            with self.subTest(output=k):
+                self.assertEqual(section[:4], ['-map', f'{k}:v:0', '-map', f'{k}:a:0?'])
+                self.assertEqual(section[-4:], ['-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts'])
+
+        self.assertEqual(
+            sections[0][sections[0].index('-filter:v') + 1],
+            build_segment_filter('/media/a.mp4', 3.0, 'vertical_portrait', None)
+        )
+        self.assertEqual(
+            sections[1][sections[1].index('-filter:v') + 1],
+            build_segment_filter(
+                '/media/a.mp4', 3.0, 'vertical_portrait', PanDirection.LEFT_TO_RIGHT
+            ) + ',drawtext=text=hi'
+        )
+        self.assertIn('libx264', sections[0])
+        self.assertNotIn('-filter:v', sections[2])
+        self.assertEqual(sections[2][4:8], ['-c:v', 'copy', '-avoid_negative_ts', 'make_zero'])
+
+    def test_group_by_source(self):
+        jobs = [
+            self.job(0.0, 's0.ts', video_path='/media/b.mp4'),
+            self.job(1.0, 's1.ts'),
+            self.job(2.0, 's2.ts', video_path='/media/b.mp4'),
+            self.job(3.0, 's3.ts'),
+            self.job(4.0, 's4.ts'),
+        ]
+        groups = group_segment_jobs(jobs, 2)
+        self.assertEqual(
+            [[job[3] for job in group] for group in groups],
+            [['s1.ts', 's3.ts'], ['s4.ts'], ['s0.ts', 's2.ts']]
+        )
+
+class TestConcat(unittest.TestCase):
+    """Concat argv construction, with run_ffmpeg mocked out."""
+
+    def test_ts_segments_use_protocol(self):
+        args, concat_list = get_concat_input_args(['/tmp/a.ts', '/tmp/b.ts'])
+        self.assertEqual(args, ['-i', 'concat:/tmp/a.ts|/tmp/b.ts'])
+        self.assertIsNone(concat_list)
+
+    def test_other_containers_use_demuxer(self):
+        for case, kwargs in [
+            ('mp4', {'segment_files': ['/tmp/a.ts', '/tmp/b.mp4']}),
+            ('use_demuxer', {'segment_files': ['/tmp/a.ts', '/tmp/b.ts'],
+                             'use_demuxer': True}),
+        ]:
+            with self.subTest(case=case):
+                args, concat_list = get_concat_input_args(**kwargs)
+                self.assertEqual(args, [
+                    '-f', 'concat', '-safe', '0',
+                    '-protocol_whitelist', 'file,pipe', '-i', 'pipe:0'
+                ])
+                self.assertEqual(concat_list, ''.join(
+                    f"file '{f}'\n" for f in kwargs['segment_files']
+                ))
+
+    def test_protocol_failure_retries_with_demuxer(self):
+        temp_dir = tempfile.mkdtemp(prefix='video_editor_test_')
+        output = os.path.join(temp_dir, 'out.mp4')
+        segments = ['/tmp/a.ts', '/tmp/b.ts']
+
+        def fake_run(cmd, input=None):
+            if input is None:
+                return subprocess.CompletedProcess(cmd, 1, '', 'bad join')
+            with open(output, 'wb') as f:
+                f.write(b'joined')
+            return subprocess.CompletedProcess(cmd, 0, '', '')
+
+        try:
+            with mock.patch.object(
+                video_editor_script, 'run_ffmpeg', side_effect=fake_run
+            ) as run, mock.patch.object(
+                video_editor_script, 'has_audio_stream', return_value=False
+            ):
+                result = create_concat_file(segments, temp_dir, output_file=output)
+            self.assertEqual(result, output)
+            self.assertEqual(run.call_count, 2)
+            first, second = (call.args[0] for call in run.call_args_list)
+            self.assertIn('concat:/tmp/a.ts|/tmp/b.ts', first)
+            self.assertIsNone(run.call_args_list[0].kwargs['input'])
+            self.assertIn('pipe:0', second)
+            self.assertEqual(
+                run.call_args_list[1].kwargs['input'],
+                "file '/tmp/a.ts'\nfile '/tmp/b.ts'\n"
+            )
+            self.assertNotIn('0:a', second)
+            self.assertEqual(second[-1], output)
+        finally:
+            if os.path.exists(output):
+                os.remove(output)
+            os.rmdir(temp_dir)
+
+class TestBatchJobs(unittest.TestCase):
+    """--batch jobs parsed with the real command line parser."""
+
+    def test_batch_job_argv(self):
+        # Shaped like the GUI's build_job: form values arrive as strings
+        job = {
+            'output': 'out.mp4',
+            'format': 'vertical_portrait',
+            'duration': '30',
+            'panning': True,
+            'pan_strategy': 'random',
+            'pan_speed': 1.5,
+            'text': None,
+            'intro_video': 'intro clip.mp4',
+            'input_video': 'my input.mp4',
+        }
+        args = build_parser().parse_args(batch_job_argv(job))
+        self.assertEqual(args.output, 'out.mp4')
+        self.assertEqual(args.format, 'vertical_portrait')
+        self.assertEqual(args.duration, 30)
+        self.assertTrue(args.panning)
+        self.assertEqual(args.pan_strategy, 'random')
+        self.assertEqual(args.pan_speed, 1.5)
+        self.assertIsNone(args.text)
+        self.assertEqual(args.intro_video, 'intro clip.mp4')
+        self.assertEqual(args.input_video, 'my input.mp4')
+
+    def test_false_flag_left_out(self):
+        args = build_parser().parse_args(batch_job_argv({'panning': False}))
+        self.assertFalse(args.panning)
+        self.assertIsNone(args.input_video)
+
+class TestFfmpegProgress(unittest.TestCase):
+    """Progress parsing used by the GUI's progress bar."""
+
+    def test_parse_ffmpeg_progress(self):
+        from video_montage_gui import parse_ffmpeg_progress
+        with self.subTest(case="time"):
+            self.assertAlmostEqual(
+                parse_ffmpeg_progress(b"frame=  10 fps=0.0 time=00:01:02.50 bitrate=N/A"),
+                62.5
+            )
+        with self.subTest(case="last_time_wins"):
+            self.assertAlmostEqual(
+                parse_ffmpeg_progress(b"time=00:00:01.00\ntime=01:00:00.25\n"),
+                3600.25
+            )
+        with self.subTest(case="n_a"):
+            self.assertEqual(parse_ffmpeg_progress(b"size=N/A time=N/A speed=N/A"), -1.0)
+        with self.subTest(case="n_a_after_time"):
+            self.assertAlmostEqual(
+                parse_ffmpeg_progress(b"time=00:00:03.00\ntime=N/A\n"), 3.0
+            )
+        with self.subTest(case="missing"):
+            self.assertEqual(parse_ffmpeg_progress(b"Press [q] to stop"), -1.0)
+            self.assertEqual(parse_ffmpeg_progress(b""), -1.0)
+
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -1,17 +1,29 @@
 #!/usr/bin/env python3
-import cmd
 import os
 import sys
 import random
 import argparse
 import subprocess
 import tempfile
+import shutil
 import math
+import functools
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from enum import Enum
 import json
 
+# Optional: NVIDIA Video Processing Framework for in-process NVDEC/NVENC
+try:
+    import numpy as np
+    import PyNvCodec as nvc
+except ImportError:
+    nvc = None
+
 # Social media aspect ratios
 ASPECT_RATIOS = {
     "vertical_portrait": {
@@ -27,6 +39,35 @@ ASPECT_RATIOS = {
 }
 
 
+# Resolve the FFmpeg binaries once instead of searching PATH on every call
+FFMPEG = shutil.which("ffmpeg") or "ffmpeg"
+FFPROBE = shutil.which("ffprobe") or "ffprobe"
+
+# Only print errors from ffmpeg; progress output is never read
+FFMPEG_QUIET_ARGS = ["-hide_banner", "-loglevel", "error", "-nostats"]
+
+# Intermediate files are written as MPEG-TS so they can be joined with the
+# byte-level concat: protocol instead of the concat demuxer
+TS_MUX_ARGS = ["-bsf:v", "h264_mp4toannexb", "-f", "mpegts"]
+
+# Segment filters that passed (or failed) a 1-frame null test, keyed by
+# (source width, source height, target aspect, pan direction, duration)
+_FILTER_CACHE = {}
+
+# Audio settings shared by all intermediate files
+SEGMENT_AUDIO_ARGS = ["-c:a", "aac", "-b:a", "192k", "-ar", "48000", "-ac", "2"]
+
+# (codec, profile, sample rate, channels) of source audio that already
+# matches SEGMENT_AUDIO_ARGS and can be stream copied into a segment
+COPYABLE_AUDIO = ("aac", "LC", 48000, 2)
+
+# MP4 outputs put the moov atom up front for streaming and QuickTime
+MP4_MUX_ARGS = ["-movflags", "+faststart"]
+
+# Threads given to each ffmpeg process when segments are encoded in parallel
+SEGMENT_THREADS_PER_JOB = 2
+
+
 # Panning types
 class PanDirection(Enum):
     LEFT_TO_RIGHT = "left_to_right"
@@ -49,60 +90,238 @@ class TextMotionType(Enum):
     DVD_BOUNCE = "dvd_bounce"
 
 
+def _spawn(cmd, **kwargs):
+    """
+    subprocess.run with the options that let CPython launch the child via
+    posix_spawn instead of fork+exec. Our descriptors are non-inheritable
+    already, so there is nothing for close_fds to close.
+    """
+    if not os.path.dirname(cmd[0]):
+        # The posix_spawn path needs the executable's full path
+        cmd = [shutil.which(cmd[0]) or cmd[0], *cmd[1:]]
+    kwargs.setdefault("close_fds", False)
+    return subprocess.run(cmd, **kwargs)
+
+
+# Seconds an ffmpeg run may go without reporting progress before it is
+# killed, and the overall limit per run (None for no limit); set from the
+# --stall-timeout and --ffmpeg-timeout options
+FFMPEG_STALL_TIMEOUT = 120
+FFMPEG_TIMEOUT = None
+
+
+def run_ffmpeg(cmd, input=None, report_progress=False):
+    """
+    Run an ffmpeg command with -progress on stdout and a watchdog, so a run
+    that hangs on a bad input is killed instead of blocking forever.
+    Returns a CompletedProcess with stderr captured, like _spawn. A libx264
+    encode that stalls is retried once with preset ultrafast.
+    report_progress prints "time=HH:MM:SS.micro" lines as the output grows,
+    for passes that write the whole montage timeline (read by the GUI).
+    """
+    result, stalled = _run_ffmpeg_watched(cmd, input, report_progress)
+    if stalled and "libx264" in cmd and "-preset" in cmd:
+        retry_cmd = list(cmd)
+        for i, arg in enumerate(retry_cmd[:-1]):
+            if arg == "-preset":
+                retry_cmd[i + 1] = "ultrafast"
+        print("Retrying stalled ffmpeg run with preset ultrafast...")
+        result, _ = _run_ffmpeg_watched(retry_cmd, input, report_progress)
+    return result
+
+
+def _run_ffmpeg_watched(cmd, input=None, report_progress=False):
+    """Run cmd once for run_ffmpeg; returns (CompletedProcess, stalled)."""
+    cmd = [cmd[0], "-progress", "pipe:1", *cmd[1:]]
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        close_fds=False,
+    )
+
+    # Every progress line resets the watchdog; stderr is drained alongside
+    # so a chatty run cannot fill the pipe and block
+    last_progress = [time.monotonic()]
+    stderr_parts = []
+
+    def read_progress():
+        for line in proc.stdout:
+            last_progress[0] = time.monotonic()
+            if report_progress and line.startswith("out_time=") and "N/A" not in line:
+                print(f"time={line[9:].strip()}", flush=True)
+
+    readers = [
+        threading.Thread(target=read_progress, daemon=True),
+        threading.Thread(
+            target=lambda: stderr_parts.append(proc.stderr.read()), daemon=True
+        ),
+    ]
+    for reader in readers:
+        reader.start()
+
+    if input is not None:
+        try:
+            proc.stdin.write(input)
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    started = time.monotonic()
+    reason = None
+    while reason is None:
+        try:
+            proc.wait(timeout=1)
+            break
+        except subprocess.TimeoutExpired:
+            now = time.monotonic()
+            if FFMPEG_STALL_TIMEOUT and now - last_progress[0] > FFMPEG_STALL_TIMEOUT:
+                reason = "stalled"
+            elif FFMPEG_TIMEOUT and now - started > FFMPEG_TIMEOUT:
+                reason = "timed out"
+    if reason:
+        proc.kill()
+        proc.wait()
+    for reader in readers:
+        # A killed run may leave a child holding the pipes open
+        reader.join(timeout=5 if reason else None)
+
+    stderr = "".join(stderr_parts)
+    if reason:
+        stderr += f"\nffmpeg {reason} and was killed"
+    result = subprocess.CompletedProcess(cmd, proc.returncode, "", stderr)
+    return result, reason == "stalled"
+
+
 def check_ffmpeg():
-    """Check if FFmpeg is installed and accessible."""
-    try:
-        subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=True,
-        )
+    """
+    Check if FFmpeg is installed and accessible.
+    Only looks the executable up on PATH; running it would load every codec
+    just to print a version nobody reads.
+    """
+    if shutil.which(FFMPEG) is not None:
         return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        print(
-            "Error: FFmpeg is not installed or not in PATH. Please install FFmpeg to use this script."
-        )
-        return False
+    print(
+        "Error: FFmpeg is not installed or not in PATH. Please install FFmpeg to use this script."
+    )
+    return False
 
 
-def get_video_duration(video_path):
-    """Get the duration of a video in seconds using FFmpeg."""
+# probe_video results, keyed by (absolute path, mtime_ns, size)
+_PROBE_CACHE = {}
+
+# Only container and stream headers are needed, so read 1 MB / 1 s of the
+# input at most instead of ffprobe's default 5 MB / 5 s
+PROBE_LIMIT_ARGS = ["-probesize", "1000000", "-analyzeduration", "1000000"]
+
+# Suffix of the JSON file that keeps an input's probe result between runs
+PROBE_SIDECAR_SUFFIX = ".probe.json"
+
+
+def probe_video(video_path, sidecar=False):
+    """
+    Get the duration, width, height and audio presence of a video with a
+    single ffprobe call.
+    Returns a dict with "duration", "width", "height" and "has_audio" keys,
+    "codec", "profile", "level", "pix_fmt", "frame_rate" and "time_base" of
+    the first video stream, plus "audio_codec", "audio_profile",
+    "sample_rate" and "channels" of the first audio stream (None without
+    audio).
+
+    With sidecar=True the result is also read from / written to a
+    <video>.probe.json file, so repeated runs over the same inputs do not
+    probe them again.
+    """
+    # Cache on the file's identity so a rewritten file is probed again
+    stat = os.stat(video_path)
+    key = (os.path.abspath(video_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _PROBE_CACHE:
+        info = _load_sidecar(video_path, stat) if sidecar else None
+        if info is None:
+            info = _probe_video(key[0])
+            if sidecar:
+                _save_sidecar(video_path, stat, info)
+        _PROBE_CACHE[key] = info
+    return dict(_PROBE_CACHE[key])
+
+
+def _load_sidecar(video_path, stat):
+    """Return the cached probe result for video_path, or None if stale or missing."""
+    try:
+        with open(video_path + PROBE_SIDECAR_SUFFIX, "r") as f:
+            data = json.load(f)
+        if data["size"] != stat.st_size or data["mtime_ns"] != stat.st_mtime_ns:
+            return None
+        # Sidecars written before the stream parameters were recorded
+        if "time_base" not in data["probe"]:
+            return None
+        return data["probe"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _save_sidecar(video_path, stat, info):
+    """Write the probe result next to video_path; failures are ignored."""
+    try:
+        with open(video_path + PROBE_SIDECAR_SUFFIX, "w") as f:
+            json.dump(
+                {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "probe": info}, f
+            )
+    except OSError:
+        pass
+
+
+def _probe_video(video_path):
+    """Run ffprobe for probe_video."""
     cmd = [
-        "ffprobe",
+        FFPROBE,
         "-v",
         "error",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "default=noprint_wrappers=1:nokey=1",
+        *PROBE_LIMIT_ARGS,
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
         video_path,
     ]
-    result = subprocess.run(
+    result = _spawn(
         cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
     )
-    return float(result.stdout.strip())
+    data = json.loads(result.stdout)
+    streams = data.get("streams", [])
+    stream = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if stream is None:
+        raise ValueError(f"{video_path}: no video stream")
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), {})
+    return {
+        "duration": float(data["format"]["duration"]),
+        "width": int(stream["width"]),
+        "height": int(stream["height"]),
+        "codec": stream.get("codec_name"),
+        "profile": stream.get("profile"),
+        "level": stream.get("level"),
+        "pix_fmt": stream.get("pix_fmt"),
+        "frame_rate": stream.get("r_frame_rate"),
+        "time_base": stream.get("time_base"),
+        "has_audio": bool(audio),
+        "audio_codec": audio.get("codec_name"),
+        "audio_profile": audio.get("profile"),
+        "sample_rate": int(audio["sample_rate"]) if "sample_rate" in audio else None,
+        "channels": audio.get("channels"),
+    }
+
+
+def get_video_duration(video_path):
+    """Get the duration of a video in seconds using FFmpeg."""
+    return probe_video(video_path)["duration"]
 
 
 def get_video_dimensions(video_path):
     """Get the width and height of a video using FFmpeg."""
-    cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "v:0",
-        "-show_entries",
-        "stream=width,height",
-        "-of",
-        "csv=s=x:p=0",
-        video_path,
-    ]
-    result = subprocess.run(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-    )
-    dimensions = result.stdout.strip().split("x")
-    return int(dimensions[0]), int(dimensions[1])
+    info = probe_video(video_path)
+    return info["width"], info["height"]
 
 
 def categorize_video(video_path):
@@ -123,13 +342,19 @@ def categorize_video(video_path):
 
 def determine_scaling_filter(video_path, target_aspect):
     """Determine how to scale and pad video to match target aspect ratio."""
+    # Get input video dimensions
+    input_width, input_height = get_video_dimensions(video_path)
+
+    return _scaling_filter_for(input_width, input_height, target_aspect)
+
+
+@functools.lru_cache(maxsize=256)
+def _scaling_filter_for(input_width, input_height, target_aspect):
+    """Build determine_scaling_filter's filter; depends only on the sizes."""
     # Get target dimensions
     target_width = ASPECT_RATIOS[target_aspect]["width"]
     target_height = ASPECT_RATIOS[target_aspect]["height"]
 
-    # Get input video dimensions
-    input_width, input_height = get_video_dimensions(video_path)
-
     # Calculate scaling factors
     width_scale = target_width / input_width
     height_scale = target_height / input_height
@@ -184,8 +409,18 @@ def validate_inputs(video_paths):
             print(f"Error: Video file not found: {path}")
             return None
 
-        category = categorize_video(path)
+    # Each ffprobe is an independent subprocess, so run them all at once;
+    # the results are cached for the rest of the run, and inputs keep them
+    # in a sidecar so warm runs skip ffprobe entirely
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(video_paths)))) as executor:
+            list(executor.map(functools.partial(probe_video, sidecar=True), video_paths))
+    except (ValueError, KeyError) as e:
+        print(f"Error: Could not read video file: {e}")
+        return None
+    categories = [categorize_video(path) for path in video_paths]
 
+    for path, category in zip(video_paths, categories):
         # Accept all non-invalid categories
         if category != "invalid":
             if category not in categorized_videos:
@@ -232,7 +467,7 @@ def analyze_audio_levels(video_path, segment_duration=3):
     try:
         # Extract audio levels using FFmpeg's volumedetect filter
         cmd = [
-            "ffmpeg",
+            FFMPEG,
             "-i",
             video_path,
             "-af",
@@ -242,9 +477,8 @@ def analyze_audio_levels(video_path, segment_duration=3):
             "-",
         ]
 
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-        )
+        # astats prints to stderr; stdout is unused
+        result = run_ffmpeg(cmd)
 
         # Parse the output to find timestamps with high audio levels
         audio_levels = []
@@ -272,7 +506,9 @@ def analyze_audio_levels(video_path, segment_duration=3):
         return []
 
 
-def extract_interesting_segments(video_path, num_segments=10, target_duration=3):
+def extract_interesting_segments(
+    video_path, num_segments=10, target_duration=3, duration=None
+):
     """
     Extract timestamps of potentially interesting segments from a video.
 
@@ -280,8 +516,10 @@ def extract_interesting_segments(video_path, num_segments=10, target_duration=3)
         video_path: Path to the video file
         num_segments: Number of segments to extract
         target_duration: Target duration for each segment in seconds
+        duration: Duration of the video if the caller already knows it
     """
-    duration = get_video_duration(video_path)
+    if duration is None:
+        duration = get_video_duration(video_path)
 
     # Get high-energy segments based on audio analysis
     high_energy_timestamps = analyze_audio_levels(video_path)
@@ -369,7 +607,7 @@ def test_filter_string(filter_string):
 
     # Create a slightly longer test video (2 seconds)
     cmd1 = [
-        "ffmpeg",
+        FFMPEG,
         "-y",
         "-f",
         "lavfi",
@@ -378,13 +616,15 @@ def test_filter_string(filter_string):
         test_input,
     ]
     try:
-        subprocess.run(cmd1, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        _spawn(
+            cmd1, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True
+        )
     except subprocess.CalledProcessError:
         print("Failed to create test video")
         return False
 
     cmd2 = [
-        "ffmpeg",
+        FFMPEG,
         "-y",
         "-i",
         test_input,
@@ -399,9 +639,9 @@ def test_filter_string(filter_string):
 
     print("Testing with command:", " ".join(cmd2))
     try:
-        result = subprocess.run(
+        result = _spawn(
             cmd2,
-            stdout=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
             stderr=subprocess.PIPE,
             universal_newlines=True,
         )
@@ -654,9 +894,13 @@ def create_text_overlay_filter(
     style="default",
     target_aspect="vertical_portrait",
     motion_type="none",
+    start_offset=0,
 ):
     """
     Create FFmpeg filter string for a single text overlay.
+
+    start_offset shifts the text schedule for a clip that starts that many
+    seconds into the montage, so the text can be drawn per segment.
     """
     if not text:
         return ""
@@ -688,11 +932,24 @@ def create_text_overlay_filter(
     else:
         y_pos = "h*0.75"
 
-    # Calculate timing
-    start_time = 0
+    # Calculate timing relative to the start of this clip
+    start_time = -start_offset
     full_opacity_start = start_time + fade_duration
-    full_opacity_end = min(full_opacity_start + display_duration, video_duration)
-    end_time = min(full_opacity_end + fade_duration, video_duration)
+    full_opacity_end = min(
+        full_opacity_start + display_duration, video_duration - start_offset
+    )
+    end_time = min(full_opacity_end + fade_duration, video_duration - start_offset)
+
+    # Montage time, used by the animated effects
+    t_expr = f"(t+{start_offset})" if start_offset else "t"
+
+    # Shared enable/alpha options. The fade in, hold and fade out ramps are
+    # folded into one min() instead of an if/else cascade per frame.
+    timing = (
+        f"enable=between(t\\,{start_time}\\,{end_time}):"
+        f"alpha=min(1\\,min((t-{start_time})/{fade_duration}\\,"
+        f"1-(t-{full_opacity_end})/{fade_duration}))"
+    )
 
     # Properly escape the text for FFmpeg
     escaped_text = text.replace("'", "\\'")
@@ -702,14 +959,14 @@ def create_text_overlay_filter(
     # For pulsing effect, adjust the size variation
     if style == "pulse":
         size_variation = base_fontsize * 0.1  # 10% size variation
-        size_expr = f"min({max_size},max({min_size},{base_fontsize}+{size_variation}*sin(2*PI*t/1.5)))"
+        size_expr = f"min({max_size},max({min_size},{base_fontsize}+{size_variation}*sin(2*PI*{t_expr}/1.5)))"
     else:
         size_expr = str(base_fontsize)
 
     # Handle DVD bounce motion
     if motion_type == TextMotionType.DVD_BOUNCE.value:
-        x_pos = f"mod(t*100,{target_width}-tw)"
-        y_pos = f"mod(t*50,{target_height}-th)"
+        x_pos = f"mod({t_expr}*100,{target_width}-tw)"
+        y_pos = f"mod({t_expr}*50,{target_height}-th)"
 
         filter_string = (
             f"drawtext="
@@ -721,30 +978,14 @@ def create_text_overlay_filter(
             f"bordercolor=black:"
             f"x='{x_pos}':"
             f"y='{y_pos}':"
-            f"enable=between(t\\,{start_time}\\,{end_time}):"
-            f"alpha=if(lt(t\\,{full_opacity_start})\\,(t-{start_time})/{fade_duration}\\,"
-            f"if(gt(t\\,{full_opacity_end})\\,1-(t-{full_opacity_end})/{fade_duration}\\,1))"
+            f"{timing}"
         )
     else:
-        # Base filter string with common parameters
-        filter_string = (
-            f"drawtext="
-            f"text='{escaped_text}':"
-            f"fontsize={size_expr}:"
-            f"fontcolor=white:"
-            f"fontfile=/System/Library/Fonts/Supplemental/Arial Black.ttf:"  # Updated path
-            f"x=if(gte(tw\\,{target_width-2*h_margin})\\,{h_margin}\\,max({h_margin}\\,(w-tw)/2)):"
-            f"y={y_pos}:"
-            f"enable=between(t\\,{start_time}\\,{end_time}):"
-            f"alpha=if(lt(t\\,{full_opacity_start})\\,(t-{start_time})/{fade_duration}\\,"
-            f"if(gt(t\\,{full_opacity_end})\\,1-(t-{full_opacity_end})/{fade_duration}\\,1))"
-        )
-
         # Add style-specific effects
         if style == "pro":  # Changed from "concert" to "pro"
-            # Enhanced pro style with multiple layers for better effect
+            # Enhanced pro style: thick black outline plus a subtle shadow,
+            # drawn by a single drawtext
             filter_string = (
-                # Main text with thick black outline
                 f"drawtext="
                 f"text='{escaped_text}':"
                 f"fontsize={size_expr}:"
@@ -752,23 +993,12 @@ def create_text_overlay_filter(
                 f"fontfile=/System/Library/Fonts/Supplemental/Arial Black.ttf:"
                 f"borderw=8:"  # Thicker border
                 f"bordercolor=black@0.9:"  # More opaque border
+                f"shadowcolor=black@0.5:"  # Semi-transparent black
+                f"shadowx=4:"  # Offset by 4 pixels
+                f"shadowy=4:"
                 f"x=if(gte(tw\\,{target_width-2*h_margin})\\,{h_margin}\\,max({h_margin}\\,(w-tw)/2)):"
                 f"y={y_pos}:"
-                f"enable=between(t\\,{start_time}\\,{end_time}):"
-                f"alpha=if(lt(t\\,{full_opacity_start})\\,(t-{start_time})/{fade_duration}\\,"
-                f"if(gt(t\\,{full_opacity_end})\\,1-(t-{full_opacity_end})/{fade_duration}\\,1))"
-                f","
-                # Add a subtle shadow effect
-                f"drawtext="
-                f"text='{escaped_text}':"
-                f"fontsize={size_expr}:"
-                f"fontcolor=black@0.5:"  # Semi-transparent black
-                f"fontfile=/System/Library/Fonts/Supplemental/Arial Black.ttf:"
-                f"x='if(gte(tw\\,{target_width-2*h_margin})\\,{h_margin}\\,max({h_margin}\\,(w-tw)/2))+4':"  # Offset by 4 pixels
-                f"y='{y_pos}+4':"  # Offset by 4 pixels
-                f"enable=between(t\\,{start_time}\\,{end_time}):"
-                f"alpha=if(lt(t\\,{full_opacity_start})\\,(t-{start_time})/{fade_duration}\\,"
-                f"if(gt(t\\,{full_opacity_end})\\,1-(t-{full_opacity_end})/{fade_duration}\\,1))"
+                f"{timing}"
             )
         elif style == "promo":
             # Promo style with yellow text and thick black outline
@@ -783,9 +1013,7 @@ def create_text_overlay_filter(
                 f"bordercolor=black@0.9:"  # More opaque border
                 f"x=if(gte(tw\\,{target_width-2*h_margin})\\,{h_margin}\\,max({h_margin}\\,(w-tw)/2)):"
                 f"y={y_pos}:"
-                f"enable=between(t\\,{start_time}\\,{end_time}):"
-                f"alpha=if(lt(t\\,{full_opacity_start})\\,(t-{start_time})/{fade_duration}\\,"
-                f"if(gt(t\\,{full_opacity_end})\\,1-(t-{full_opacity_end})/{fade_duration}\\,1))"
+                f"{timing}"
             )
         elif style == "impact":
             # Impact style with white text and thick black outline
@@ -800,14 +1028,22 @@ def create_text_overlay_filter(
                 f"bordercolor=black@0.9:"  # More opaque border
                 f"x=if(gte(tw\\,{target_width-2*h_margin})\\,{h_margin}\\,max({h_margin}\\,(w-tw)/2)):"
                 f"y={y_pos}:"
-                f"enable=between(t\\,{start_time}\\,{end_time}):"
-                f"alpha=if(lt(t\\,{full_opacity_start})\\,(t-{start_time})/{fade_duration}\\,"
-                f"if(gt(t\\,{full_opacity_end})\\,1-(t-{full_opacity_end})/{fade_duration}\\,1))"
+                f"{timing}"
             )
         else:
-            # Add standard border for other styles
-            filter_string += (
-                f":borderw=8:bordercolor=black"  # Updated default border width
+            # Standard border for other styles, embedded in the template rather
+            # than appended to the finished string
+            border_suffix = ":borderw=8:bordercolor=black"  # Updated default border width
+            filter_string = (
+                f"drawtext="
+                f"text='{escaped_text}':"
+                f"fontsize={size_expr}:"
+                f"fontcolor=white:"
+                f"fontfile=/System/Library/Fonts/Supplemental/Arial Black.ttf:"  # Updated path
+                f"x=if(gte(tw\\,{target_width-2*h_margin})\\,{h_margin}\\,max({h_margin}\\,(w-tw)/2)):"
+                f"y={y_pos}:"
+                f"{timing}"
+                f"{border_suffix}"
             )
 
     return filter_string
@@ -861,18 +1097,62 @@ def create_logo_overlay_filter(
     return filter_string
 
 
+# Render node used by the VAAPI (and QSV) encoders on Linux
+VAAPI_DEVICE = "/dev/dri/renderD128"
+
+# Filters that move software frames onto the encoder's device
+HW_UPLOAD_FILTERS = {
+    "h264_vaapi": "format=nv12,hwupload",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_ffmpeg_encoders():
+    """Return the set of encoder names this FFmpeg build supports."""
+    try:
+        result = _spawn(
+            [FFMPEG, "-hide_banner", "-encoders"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        )
+    except (subprocess.SubprocessError, FileNotFoundError):
+        return frozenset()
+
+    # Lines look like " V....D h264_nvenc   NVIDIA NVENC H.264 encoder"
+    encoders = set()
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in "VAS":
+            encoders.add(parts[1])
+    return frozenset(encoders)
+
+
+def get_hw_device_args(hw_encoder):
+    """Return the global options that open the device for hw_encoder."""
+    if hw_encoder == "h264_vaapi":
+        return ["-vaapi_device", VAAPI_DEVICE]
+    return []
+
+
+@functools.lru_cache(maxsize=None)
 def detect_hardware_encoders():
     """
     Detect available hardware encoders on the system.
     Returns a tuple of (video_encoder, device, thread_count) or (None, None, None) if no hardware acceleration is available.
+
+    Only encoders this FFmpeg build was compiled with are considered.
     """
     thread_count = os.cpu_count() or 4
+    encoders = get_ffmpeg_encoders()
 
     # Check for macOS (Apple Silicon or Intel)
     if sys.platform == "darwin":
+        if "h264_videotoolbox" not in encoders:
+            return None, None, thread_count
         try:
             # Check for Apple Silicon (M1/M2) VideoToolbox
-            result = subprocess.run(
+            result = _spawn(
                 ["sysctl", "machdep.cpu.brand_string"], capture_output=True, text=True
             )
             if "Apple" in result.stdout:
@@ -885,10 +1165,14 @@ def detect_hardware_encoders():
 
     # Check for NVIDIA GPU
     try:
-        result = subprocess.run(["nvidia-smi"], capture_output=True, text=True)
+        if "h264_nvenc" not in encoders:
+            raise FileNotFoundError("h264_nvenc")
+        result = _spawn(
+            ["nvidia-smi"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
         if result.returncode == 0:
             # Get GPU memory info
-            memory_info = subprocess.run(
+            memory_info = _spawn(
                 [
                     "nvidia-smi",
                     "--query-gpu=memory.total",
@@ -904,113 +1188,401 @@ def detect_hardware_encoders():
     except:
         pass
 
+    # Check for an Intel/AMD GPU render node that can actually encode H.264;
+    # VMs and GPUs without an H.264 encode profile still have the node
+    if (
+        os.path.exists(VAAPI_DEVICE)
+        and "h264_vaapi" in encoders
+        and hw_encoder_works("h264_vaapi")
+    ):
+        return "h264_vaapi", VAAPI_DEVICE, thread_count
+
     return None, None, thread_count
 
 
+@functools.lru_cache(maxsize=None)
+def hw_encoder_works(hw_encoder):
+    """Check with a 1-frame test encode that hw_encoder can open its device."""
+    filter_string = "null"
+    if hw_encoder in HW_UPLOAD_FILTERS:
+        filter_string = HW_UPLOAD_FILTERS[hw_encoder]
+    cmd = [
+        FFMPEG,
+        *FFMPEG_QUIET_ARGS,
+        *get_hw_device_args(hw_encoder),
+        "-f",
+        "lavfi",
+        "-i",
+        "color=c=black:s=256x256:d=0.1",
+        "-frames:v",
+        "1",
+        "-vf",
+        filter_string,
+        "-c:v",
+        hw_encoder,
+        "-f",
+        "null",
+        "-",
+    ]
+    try:
+        result = _spawn(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return result.returncode == 0
+    except (subprocess.SubprocessError, OSError):
+        return False
+
+
+# NVDEC decoders that can crop and resize on the GPU while decoding
+CUVID_DECODERS = {
+    "h264": "h264_cuvid",
+    "hevc": "hevc_cuvid",
+    "vp9": "vp9_cuvid",
+    "av1": "av1_cuvid",
+    "mpeg4": "mpeg4_cuvid",
+}
+
+
+def get_video_codec(video_path):
+    """Get the codec name of the first video stream using FFmpeg."""
+    return probe_video(video_path)["codec"]
+
+
+def get_cuda_decode_args(video_path, target_aspect, zoom=1.0):
+    """
+    Build input arguments that decode on NVDEC and crop/resize to the target
+    size before the frames leave GPU memory, so NVENC can encode them directly.
+
+    The crop is the source-space equivalent of scaling to fill the target
+    (times zoom) and centre cropping. Returns None if the codec has no cuvid
+    decoder.
+    """
+    decoder = CUVID_DECODERS.get(get_video_codec(video_path))
+    if not decoder:
+        return None
+
+    target_width = ASPECT_RATIOS[target_aspect]["width"]
+    target_height = ASPECT_RATIOS[target_aspect]["height"]
+    input_width, input_height = get_video_dimensions(video_path)
+
+    scale_factor = max(target_width / input_width, target_height / input_height) * zoom
+    crop_width = int(target_width / scale_factor)
+    crop_height = int(target_height / scale_factor)
+    left = (input_width - crop_width) // 2 // 2 * 2
+    top = (input_height - crop_height) // 2 // 2 * 2
+    right = input_width - crop_width - left
+    bottom = input_height - crop_height - top
+
+    return [
+        "-hwaccel",
+        "cuda",
+        "-hwaccel_output_format",
+        "cuda",
+        "-c:v",
+        decoder,
+        "-crop",
+        f"{top}x{bottom}x{left}x{right}",
+        "-resize",
+        f"{target_width}x{target_height}",
+    ]
+
+
+# Video codec arguments per (encoder, quality), built once at import.
+# None is the libx264 CPU fallback.
+_ENCODER_TEMPLATES = {
+    ("h264_nvenc", "fast"): [
+        "-c:v",
+        "h264_nvenc",
+        "-preset",
+        "p1",  # Fastest preset
+        "-tune",
+        "ll",  # Low latency
+        "-rc",
+        "cbr",  # Constant bitrate
+        "-b:v",
+        "10M",
+    ],
+    ("h264_nvenc", "final"): [
+        "-c:v",
+        "h264_nvenc",
+        "-preset",
+        "p4",  # Highest quality preset
+        "-rc",
+        "vbr",  # Variable bitrate
+        "-cq",
+        "20",  # Quality-based VBR
+        "-b:v",
+        "10M",  # Higher bitrate for better quality
+        "-maxrate",
+        "15M",  # Maximum bitrate
+        "-bufsize",
+        "15M",  # Buffer size
+        "-spatial-aq",
+        "1",  # Spatial adaptive quantization
+        "-temporal-aq",
+        "1",  # Temporal adaptive quantization
+    ],
+    ("h264_vaapi", "fast"): [
+        "-c:v",
+        "h264_vaapi",
+        "-rc_mode",
+        "CBR",  # Constant bitrate
+        "-b:v",
+        "10M",
+    ],
+    ("h264_vaapi", "final"): [
+        "-c:v",
+        "h264_vaapi",
+        "-rc_mode",
+        "VBR",  # Variable bitrate
+        "-b:v",
+        "10M",
+        "-maxrate",
+        "15M",  # Maximum bitrate
+        "-bufsize",
+        "15M",  # Buffer size
+    ],
+    ("h264_videotoolbox", "final"): [
+        "-c:v",
+        "h264_videotoolbox",
+        "-b:v",
+        "10M",  # Higher bitrate for M2 Max
+        "-maxrate",
+        "15M",  # Maximum bitrate
+        "-bufsize",
+        "15M",  # Buffer size
+        "-tag:v",
+        "avc1",  # Ensure compatibility
+    ],
+    # Fallback to CPU encoding with good quality settings; x264 picks its
+    # own frame thread count
+    (None, "final"): [
+        "-c:v",
+        "libx264",
+        "-preset",
+        "fast",
+        "-crf",
+        "23",
+        "-x264-params",
+        "sliced-threads=0:threads=auto",
+    ],
+}
+_ENCODER_TEMPLATES[("h264_videotoolbox", "fast")] = _ENCODER_TEMPLATES[
+    ("h264_videotoolbox", "final")
+] + ["-realtime", "1"]
+_ENCODER_TEMPLATES[(None, "fast")] = _ENCODER_TEMPLATES[(None, "final")]
+
+# Per-process thread flags; {threads} and {filter_threads} are filled in
+# per call. None is the CPU path.
+_THREAD_TEMPLATES = {
+    # M1/M2 optimizations
+    "h264_videotoolbox": [
+        "-threads",
+        "{threads}",
+        "-filter_threads",
+        "{threads}",
+        "-filter_complex_threads",
+        "{threads}",
+    ],
+    # NVIDIA optimizations
+    "h264_nvenc": [
+        "-threads",
+        "{threads}",
+        "-extra_hw_frames",
+        "3",  # Buffer for hardware frames
+        "-gpu_init_delay",
+        "0.1",  # Faster GPU initialization
+    ],
+    # CPU optimizations; let the codec size its own thread pool and keep
+    # the filter threads small so the two don't oversubscribe the cores
+    None: [
+        "-threads",
+        "0",
+        "-filter_threads",
+        "{filter_threads}",
+        "-filter_complex_threads",
+        "{filter_threads}",
+    ],
+}
+
+
+def get_video_encoder_args(hw_encoder=None, quality="final", threads=None):
+    """
+    Return the video codec arguments for the given encoder, falling back to
+    CPU encoding with libx264 when no hardware encoder is available.
+
+    quality="fast" is meant for intermediate files that get re-encoded or
+    concatenated later; "final" keeps the high quality settings for the
+    file the user receives.
+    threads pins the libx264 thread count instead of letting x264 size it
+    for the whole machine, for encodes that run several at a time.
+    """
+    template = _ENCODER_TEMPLATES.get((hw_encoder, quality))
+    if template is None:
+        # Other hardware encoders run with their defaults
+        template = ["-c:v", hw_encoder] if hw_encoder else _ENCODER_TEMPLATES[(None, quality)]
+    if threads and not hw_encoder:
+        return [arg.replace("threads=auto", f"threads={threads}") for arg in template]
+    return list(template)
+
+
+def get_thread_args(hw_encoder, thread_count):
+    """Return the thread flags for the given encoder from _THREAD_TEMPLATES."""
+    template = _THREAD_TEMPLATES.get(hw_encoder, _THREAD_TEMPLATES[None])
+    return [
+        arg.format(threads=thread_count, filter_threads=min(4, thread_count))
+        for arg in template
+    ]
+
+
+def get_segment_stream_args(hw_encoder=None, video_path=None):
+    """
+    Return the keyframe and audio arguments every intermediate file is
+    written with, so the concat step can stream copy instead of re-encoding.
+    """
+    args = ["-force_key_frames", "0"]
+    if hw_encoder:
+        # Hardware encoders pick long GOPs by default; keep one per second
+        args.extend(["-g", "30"])
+    args.extend(get_segment_audio_args(video_path))
+    return args
+
+
+def get_segment_audio_args(video_path=None):
+    """
+    Return the audio arguments for a segment cut from video_path. Audio that
+    already matches SEGMENT_AUDIO_ARGS is copied, anything else is encoded
+    to those parameters so all segments still concatenate with -c copy.
+    """
+    if video_path:
+        try:
+            info = probe_video(video_path)
+            params = (
+                info.get("audio_codec"),
+                info.get("audio_profile"),
+                info.get("sample_rate"),
+                info.get("channels"),
+            )
+            if params == COPYABLE_AUDIO:
+                return ["-c:a", "copy"]
+        except Exception:
+            pass
+    return list(SEGMENT_AUDIO_ARGS)
+
+
+# Stream parameters that must match for copied H.264 segments from
+# different sources to be joined into one playable stream. Audio is brought
+# to SEGMENT_AUDIO_ARGS by get_segment_audio_args, so only its presence
+# has to match.
+STREAM_COPY_KEYS = (
+    "codec",
+    "profile",
+    "level",
+    "pix_fmt",
+    "frame_rate",
+    "time_base",
+    "has_audio",
+)
+
+
+def can_stream_copy(video_path, target_aspect):
+    """
+    Check whether segments of a video can be cut without re-encoding,
+    i.e. it is already H.264 at exactly the target size.
+    """
+    try:
+        target_size = (
+            ASPECT_RATIOS[target_aspect]["width"],
+            ASPECT_RATIOS[target_aspect]["height"],
+        )
+        return (
+            get_video_dimensions(video_path) == target_size
+            and get_video_codec(video_path) == "h264"
+        )
+    except Exception:
+        return False
+
+
+def can_stream_copy_together(video_paths, target_aspect):
+    """
+    Check whether segments cut from all of video_paths can be joined without
+    re-encoding: each source must be copyable on its own, and when there is
+    more than one they must share profile, level, pixel format, frame rate,
+    time base and whether they have audio.
+    """
+    video_paths = set(video_paths)
+    if not all(can_stream_copy(path, target_aspect) for path in video_paths):
+        return False
+    params = {
+        tuple(probe_video(path).get(key) for key in STREAM_COPY_KEYS)
+        for path in video_paths
+    }
+    return len(params) == 1
+
+
 def create_ffmpeg_command(
-    input_file, output_file, vf_filter, duration=None, hw_encoder=None, thread_count=4
+    input_file,
+    output_file,
+    vf_filter,
+    duration=None,
+    hw_encoder=None,
+    thread_count=4,
+    quality="fast",
+    target_aspect=None,
+    start_time=None,
+    container=None,
 ):
     """
     Create an FFmpeg command with hardware acceleration if available.
+    quality is passed through to get_video_encoder_args ("fast" or "final").
+    With NVENC and a target_aspect, the scale/crop is done by the NVDEC
+    decoder and vf_filter is not used.
+    start_time is emitted before -i so FFmpeg seeks in the container
+    instead of decoding and discarding everything up to that point.
+    container="ts" writes MPEG-TS for joining with create_concat_file.
     """
-    cmd = ["ffmpeg", "-y"]
+    cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
 
     # System-specific optimizations
-    if hw_encoder == "h264_videotoolbox":
-        # M1/M2 optimizations
-        cmd.extend(
-            [
-                "-threads",
-                str(thread_count),
-                "-filter_threads",
-                str(thread_count),
-                "-filter_complex_threads",
-                str(thread_count),
-            ]
-        )
-    elif hw_encoder == "h264_nvenc":
-        # NVIDIA optimizations
-        cmd.extend(
-            [
-                "-threads",
-                str(thread_count),
-                "-extra_hw_frames",
-                "3",  # Buffer for hardware frames
-                "-gpu_init_delay",
-                "0.1",  # Faster GPU initialization
-            ]
-        )
-    else:
-        # CPU optimizations
-        cmd.extend(
-            [
-                "-threads",
-                str(thread_count),
-                "-filter_threads",
-                str(thread_count),
-                "-filter_complex_threads",
-                str(thread_count),
-            ]
-        )
+    cmd.extend(get_thread_args(hw_encoder, thread_count))
+    cmd.extend(get_hw_device_args(hw_encoder))
+
+    # Keep frames in GPU memory from decode to encode where possible
+    gpu_decode_args = None
+    if hw_encoder == "h264_nvenc" and target_aspect:
+        gpu_decode_args = get_cuda_decode_args(input_file, target_aspect)
+
+    # Input seek
+    if start_time:
+        cmd.extend(["-ss", str(start_time)])
 
     # Input file
-    if hw_encoder in ["h264_qsv", "h264_nvenc"]:
+    if gpu_decode_args:
+        cmd.extend(gpu_decode_args)
+    elif hw_encoder == "h264_nvenc":
         cmd.extend(["-hwaccel", "auto"])
+    elif hw_encoder == "h264_videotoolbox":
+        cmd.extend(["-hwaccel", "videotoolbox"])
     cmd.extend(["-i", input_file])
 
     # Add duration limit if specified
     if duration:
         cmd.extend(["-t", str(duration)])
 
-    # Video filter
-    cmd.extend(["-vf", vf_filter])
+    # Video filter; GPU decoded frames are already at the target size
+    if not gpu_decode_args:
+        if hw_encoder in HW_UPLOAD_FILTERS:
+            vf_filter = f"{vf_filter},{HW_UPLOAD_FILTERS[hw_encoder]}"
+        cmd.extend(["-vf", vf_filter])
 
     # Video codec settings
-    if hw_encoder:
-        cmd.extend(["-c:v", hw_encoder])
+    cmd.extend(get_video_encoder_args(hw_encoder, quality))
 
-        if hw_encoder == "h264_nvenc":
-            cmd.extend(
-                [
-                    "-preset",
-                    "p4",  # Highest quality preset
-                    "-rc",
-                    "vbr",  # Variable bitrate
-                    "-cq",
-                    "20",  # Quality-based VBR
-                    "-b:v",
-                    "10M",  # Higher bitrate for better quality
-                    "-maxrate",
-                    "15M",  # Maximum bitrate
-                    "-bufsize",
-                    "15M",  # Buffer size
-                    "-spatial-aq",
-                    "1",  # Spatial adaptive quantization
-                    "-temporal-aq",
-                    "1",  # Temporal adaptive quantization
-                ]
-            )
-        elif hw_encoder == "h264_videotoolbox":
-            cmd.extend(
-                [
-                    "-b:v",
-                    "10M",  # Higher bitrate for M2 Max
-                    "-maxrate",
-                    "15M",  # Maximum bitrate
-                    "-bufsize",
-                    "15M",  # Buffer size
-                    "-tag:v",
-                    "avc1",  # Ensure compatibility
-                    "-movflags",
-                    "+faststart",  # Optimize for streaming
-                ]
-            )
-    else:
-        # Fallback to CPU encoding with good quality settings
-        cmd.extend(["-c:v", "libx264", "-preset", "fast", "-crf", "23"])
+    # Keyframe and audio settings shared by all intermediate files
+    cmd.extend(get_segment_stream_args(hw_encoder))
 
-    # Audio codec
-    cmd.extend(["-c:a", "aac", "-b:a", "192k"])
+    if container == "ts":
+        cmd.extend(TS_MUX_ARGS)
+    else:
+        cmd.extend(MP4_MUX_ARGS)
 
     # Output file
     cmd.append(output_file)
@@ -1025,7 +1597,7 @@ def process_intro_segment(
     if not intro_video_path or not os.path.exists(intro_video_path):
         return None
 
-    intro_segment_file = os.path.join(temp_dir, "intro_segment.mp4")
+    intro_segment_file = os.path.join(temp_dir, "intro_segment.ts")
 
     try:
         # Get the scaling filter for the intro video
@@ -1048,6 +1620,8 @@ def process_intro_segment(
                 output_file=intro_segment_file,
                 vf_filter=scaling_filter,
                 hw_encoder=hw_encoder,
+                target_aspect=target_aspect,
+                container="ts",
                 duration=max_intro_length,  # Use the specified max length
             )
         else:
@@ -1058,11 +1632,11 @@ def process_intro_segment(
                 output_file=intro_segment_file,
                 vf_filter=scaling_filter,
                 hw_encoder=hw_encoder,
+                target_aspect=target_aspect,
+                container="ts",
             )
 
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-        )
+        result = run_ffmpeg(cmd)
 
         if result.returncode != 0 or not os.path.exists(intro_segment_file):
             print(f"Warning: Failed to process intro video: {result.stderr}")
@@ -1078,52 +1652,83 @@ def process_intro_segment(
         return None
 
 
-def create_concat_file(segment_files, temp_dir):
-    """Create a concatenated video file from segment files."""
-    # Create a file with list of segments for FFmpeg concat
-    concat_file = os.path.join(temp_dir, "concat_list.txt")
-    try:
-        with open(concat_file, "w") as f:
-            for segment_file in segment_files:
-                f.write(f"file '{segment_file}'\n")
+def get_concat_input_args(segment_files, use_demuxer=False):
+    """
+    Return (input arguments, stdin text) that read segment_files as one
+    input: the concat: protocol for MPEG-TS segments, otherwise the concat
+    demuxer with its file list to be passed on stdin (None for the protocol).
+    """
+    if not use_demuxer and all(f.endswith(".ts") for f in segment_files):
+        return ["-i", f"concat:{'|'.join(segment_files)}"], None
+    concat_list = "".join(f"file '{f}'\n" for f in segment_files)
+    return [
+        "-f",
+        "concat",
+        "-safe",
+        "0",
+        "-protocol_whitelist",
+        "file,pipe",
+        "-i",
+        "pipe:0",
+    ], concat_list
 
+
+def create_concat_file(
+    segment_files, temp_dir, use_demuxer=False, output_file=None, duration=None
+):
+    """
+    Create a concatenated video file from segment files.
+    MPEG-TS segments are joined with the concat: protocol, which reads them
+    back to back without probing each file. Other containers go through the
+    concat demuxer, with the file list passed on stdin rather than written
+    to disk. If the byte-level join fails, it is retried once through the
+    demuxer, which re-times each file.
+    output_file writes the result there instead of a temp file, cut to
+    duration if given, for montages that need no further processing.
+    """
+    try:
         # Concatenate all segments
-        temp_output = os.path.join(temp_dir, "temp_output.mp4")
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-f",
-            "concat",
-            "-safe",
-            "0",
-            "-i",
-            concat_file,
-            "-c:v",
-            "libx264",  # Use libx264 for video
-            "-c:a",
-            "aac",  # Use AAC for audio
-            "-b:a",
-            "192k",  # Set audio bitrate
-            "-strict",
-            "experimental",  # Allow experimental codecs
-            "-map",
-            "0:v",  # Map video stream
-        ]
+        temp_output = output_file or os.path.join(temp_dir, "temp_output.mp4")
+        cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
+        input_args, concat_list = get_concat_input_args(segment_files, use_demuxer)
+        use_protocol = concat_list is None
+        cmd.extend(input_args)
+        cmd.extend(
+            [
+                "-c",
+                "copy",  # Segments share codec parameters, so no re-encode
+                "-bsf:a",
+                "aac_adtstoasc",
+                "-movflags",
+                "+faststart",
+                "-map",
+                "0:v",  # Map video stream
+            ]
+        )
 
         # Only add audio mapping if at least one file has audio
         if any(has_audio_stream(f) for f in segment_files):
             cmd.extend(["-map", "0:a"])  # Map audio stream
 
+        if duration:
+            cmd.extend(["-t", str(duration)])
         cmd.append(temp_output)
-        print(f"Creating intermediate file: {temp_output}")
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-        )
+        print(f"Concatenating segments into: {temp_output}")
+        result = run_ffmpeg(cmd, input=concat_list)
 
         # Check if the command was successful
         if result.returncode != 0:
             print("FFmpeg Error during concat:")
             print(result.stderr)
+            if use_protocol:
+                print("Retrying concat through the concat demuxer...")
+                return create_concat_file(
+                    segment_files,
+                    temp_dir,
+                    use_demuxer=True,
+                    output_file=output_file,
+                    duration=duration,
+                )
             return None
 
         # Verify the temp file was created
@@ -1131,9 +1736,9 @@ def create_concat_file(segment_files, temp_dir):
             print("Temp directory contents:")
             for file in os.listdir(temp_dir):
                 print(f"  - {file}")
-            print("Concat file contents:")
-            with open(concat_file, "r") as f:
-                print(f.read())
+            print("Concatenated segments:")
+            for segment_file in segment_files:
+                print(f"  - {segment_file}")
             return None
 
         return temp_output
@@ -1173,12 +1778,20 @@ def fallback_create_output(
     video_streams = []
     audio_streams = []
 
+    # Segments are normally already at the target size; probe each file
+    # once so only the ones that are not get scaled
+    dims = {f: get_video_dimensions(f) for f in set(segment_files)}
+
     # Process each input file
     for i, segment_file in enumerate(segment_files):
         inputs.extend(["-i", segment_file])
         
         # Add video scaling, normalize SAR, and ensure consistent frame rate
-        filter_complex.append(f"[{i}:v]scale={target_width}:{target_height},setsar=1:1,fps=30[v{i}]")
+        if dims[segment_file] != (target_width, target_height):
+            scale_or_null = f"scale={target_width}:{target_height}"
+        else:
+            scale_or_null = "null"
+        filter_complex.append(f"[{i}:v]{scale_or_null},setsar=1:1,fps=30[v{i}]")
         video_streams.append(f"[v{i}]")
         
         # Only add audio processing if the file has audio
@@ -1230,7 +1843,7 @@ def fallback_create_output(
     print("Debug: Filter complex string:", filter_complex_str)  # Add debug output
 
     # Build the final FFmpeg command
-    cmd = ["ffmpeg", "-y"]
+    cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
     cmd.extend(inputs)
     cmd.extend(["-filter_complex", filter_complex_str])
     cmd.extend(["-map", video_output])
@@ -1243,7 +1856,7 @@ def fallback_create_output(
     # Add video codec settings optimized for social media
     cmd.extend([
         "-c:v", "libx264",  # H.264 codec
-        "-preset", "medium",  # Balance between speed and quality
+        "-preset", "veryfast",  # Recovery path, favour speed
         "-crf", "23",  # Constant Rate Factor (18-28 is good, lower = better quality)
         "-g", "30",  # Keyframe interval (1 second at 30fps)
         "-keyint_min", "30",  # Minimum keyframe interval
@@ -1266,9 +1879,7 @@ def fallback_create_output(
     print("Filter complex:", filter_complex_str)
 
     # Execute the command
-    result = subprocess.run(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-    )
+    result = run_ffmpeg(cmd, report_progress=True)
 
     if result.returncode != 0:
         print("FFmpeg Error in fallback method:")
@@ -1282,28 +1893,9 @@ def fallback_create_output(
 def has_audio_stream(video_path):
     """Check if a video file has an audio stream."""
     try:
-        cmd = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-select_streams",
-            "a",
-            "-show_streams",
-            "-of",
-            "json",
-            video_path,
-        ]
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-        )
-        if result.returncode != 0:
-            return False
-            
-        # Parse the JSON output
-        data = json.loads(result.stdout)
-        
-        # Check if there are any audio streams
-        return "streams" in data and len(data["streams"]) > 0
+        # Shares the cached probe, so building the single-pass graph does
+        # not spawn an extra ffprobe per segment
+        return probe_video(video_path)["has_audio"]
     except Exception as e:
         print(f"Warning: Error checking audio stream: {e}")
         return False
@@ -1334,153 +1926,212 @@ def parse_input_string(input_string):
     return output_name, format_name, input_videos
 
 
-def create_video_segment(
-    video_path, start_time, segment_duration, output_file, target_aspect, direction
-):
-    """Create a single video segment with the specified parameters."""
-    try:
-        # Get target dimensions
-        target_width = ASPECT_RATIOS[target_aspect]["width"]
-        target_height = ASPECT_RATIOS[target_aspect]["height"]
+def build_segment_filter(video_path, segment_duration, target_aspect, direction):
+    """Build the scale/crop (and optional panning) filter for one montage segment."""
+    # Get target dimensions
+    target_width = ASPECT_RATIOS[target_aspect]["width"]
+    target_height = ASPECT_RATIOS[target_aspect]["height"]
 
-        # Get input video dimensions
-        input_width, input_height = get_video_dimensions(video_path)
+    # Get input video dimensions
+    input_width, input_height = get_video_dimensions(video_path)
 
-        # Calculate scaling factors - scale up by 20% to allow for movement
-        width_scale = (target_width * 1.2) / input_width
-        height_scale = (target_height * 1.2) / input_height
-        scale_factor = max(width_scale, height_scale)
+    # Calculate scaling factors - scale up by 20% to allow for movement
+    width_scale = (target_width * 1.2) / input_width
+    height_scale = (target_height * 1.2) / input_height
+    scale_factor = max(width_scale, height_scale)
 
-        # Calculate new dimensions after scaling
-        new_width = int(input_width * scale_factor)
-        new_height = int(input_height * scale_factor)
+    # Calculate new dimensions after scaling
+    new_width = int(input_width * scale_factor)
+    new_height = int(input_height * scale_factor)
 
-        # Calculate crop offsets
-        crop_x = max(0, (new_width - target_width) // 2)
-        crop_y = max(0, (new_height - target_height) // 2)
+    # Calculate crop offsets
+    crop_x = max(0, (new_width - target_width) // 2)
+    crop_y = max(0, (new_height - target_height) // 2)
 
-        # Base filter for scaling
-        base_filter = f"scale={new_width}:{new_height}:force_original_aspect_ratio=1"
-
-        # Add panning if needed
-        if direction and segment_duration >= 2.0:
-            # Calculate frames for duration
-            fps = 30  # Assuming 30fps
-            duration_frames = int(segment_duration * fps)
-
-            # Create panning filter based on direction
-            if direction == PanDirection.LEFT_TO_RIGHT:
-                # Pan from left to right using frame number
-                pan_filter = f"crop=w={target_width}:h={target_height}:x='{crop_x}+({new_width-target_width})*0.2*n/{duration_frames}':y={crop_y}"
-            elif direction == PanDirection.RIGHT_TO_LEFT:
-                # Pan from right to left using frame number
-                pan_filter = f"crop=w={target_width}:h={target_height}:x='{crop_x}+({new_width-target_width})*0.2*(1-n/{duration_frames})':y={crop_y}"
-            elif direction == PanDirection.ZOOM_IN:
-                # Zoom in effect using frame number
-                pan_filter = f"crop=w='{target_width}*(1+0.2*n/{duration_frames})':h='{target_height}*(1+0.2*n/{duration_frames})':x='({new_width}-{target_width}*(1+0.2*n/{duration_frames}))/2':y='({new_height}-{target_height}*(1+0.2*n/{duration_frames}))/2'"
-            elif direction == PanDirection.ZOOM_OUT:
-                # Zoom out effect using frame number
-                pan_filter = f"crop=w='{target_width}*(1+0.2-0.2*n/{duration_frames})':h='{target_height}*(1+0.2-0.2*n/{duration_frames})':x='({new_width}-{target_width}*(1+0.2-0.2*n/{duration_frames}))/2':y='({new_height}-{target_height}*(1+0.2-0.2*n/{duration_frames}))/2'"
-            else:
-                pan_filter = ""
+    # Base filter for scaling
+    base_filter = f"scale={new_width}:{new_height}:force_original_aspect_ratio=1"
+
+    # Add panning if needed
+    if direction and segment_duration >= 2.0:
+        # Calculate frames for duration
+        fps = 30  # Assuming 30fps
+        duration_frames = int(segment_duration * fps)
+
+        # Create panning filter based on direction
+        if direction == PanDirection.LEFT_TO_RIGHT:
+            # Pan from left to right using frame number
+            pan_filter = f"crop=w={target_width}:h={target_height}:x='{crop_x}+({new_width-target_width})*0.2*n/{duration_frames}':y={crop_y}"
+        elif direction == PanDirection.RIGHT_TO_LEFT:
+            # Pan from right to left using frame number
+            pan_filter = f"crop=w={target_width}:h={target_height}:x='{crop_x}+({new_width-target_width})*0.2*(1-n/{duration_frames})':y={crop_y}"
+        elif direction == PanDirection.ZOOM_IN:
+            # Zoom in effect using frame number
+            pan_filter = f"crop=w='{target_width}*(1+0.2*n/{duration_frames})':h='{target_height}*(1+0.2*n/{duration_frames})':x='({new_width}-{target_width}*(1+0.2*n/{duration_frames}))/2':y='({new_height}-{target_height}*(1+0.2*n/{duration_frames}))/2'"
+        elif direction == PanDirection.ZOOM_OUT:
+            # Zoom out effect using frame number
+            pan_filter = f"crop=w='{target_width}*(1+0.2-0.2*n/{duration_frames})':h='{target_height}*(1+0.2-0.2*n/{duration_frames})':x='({new_width}-{target_width}*(1+0.2-0.2*n/{duration_frames}))/2':y='({new_height}-{target_height}*(1+0.2-0.2*n/{duration_frames}))/2'"
+        else:
+            pan_filter = ""
 
-            # Combine filters
-            if pan_filter:
-                filter_string = f"{base_filter},{pan_filter}"
-            else:
-                filter_string = base_filter
+        # Combine filters
+        if pan_filter:
+            filter_string = f"{base_filter},{pan_filter}"
         else:
-            # If no panning, just crop to target size
-            filter_string = (
-                f"{base_filter},crop={target_width}:{target_height}:{crop_x}:{crop_y}"
-            )
+            filter_string = base_filter
+    else:
+        # If no panning, just crop to target size
+        filter_string = (
+            f"{base_filter},crop={target_width}:{target_height}:{crop_x}:{crop_y}"
+        )
 
-        # Create FFmpeg command with hardware acceleration if available
-        hw_encoder, _, thread_count = detect_hardware_encoders()
+    return filter_string
 
-        cmd = ["ffmpeg", "-y"]
 
-        # Add hardware acceleration if available
-        if hw_encoder:
-            if hw_encoder == "h264_videotoolbox":
-                cmd.extend(
-                    [
-                        "-threads",
-                        str(thread_count),
-                        "-filter_threads",
-                        str(thread_count),
-                        "-filter_complex_threads",
-                        str(thread_count),
-                    ]
-                )
-            elif hw_encoder == "h264_nvenc":
-                cmd.extend(
-                    [
-                        "-threads",
-                        str(thread_count),
-                        "-extra_hw_frames",
-                        "3",
-                        "-gpu_init_delay",
-                        "0.1",
-                    ]
-                )
+def get_checked_segment_filter(video_path, segment_duration, target_aspect, direction):
+    """
+    Return (filter_string, direction) for a segment, checking each unique
+    filter once with a 1-frame null encode. A filter that fails is replaced
+    by the static crop, and the returned direction is None.
+    """
+    input_width, input_height = get_video_dimensions(video_path)
+    key = (input_width, input_height, target_aspect, direction, segment_duration)
 
-        # Add input parameters
-        cmd.extend(
-            ["-ss", str(start_time), "-i", video_path, "-t", str(segment_duration)]
+    if key not in _FILTER_CACHE:
+        filter_string = build_segment_filter(
+            video_path, segment_duration, target_aspect, direction
         )
+        if direction:
+            cmd = [
+                FFMPEG,
+                *FFMPEG_QUIET_ARGS,
+                "-f",
+                "lavfi",
+                "-i",
+                f"color=black:s={input_width}x{input_height}",
+                "-vf",
+                filter_string,
+                "-frames:v",
+                "1",
+                "-f",
+                "null",
+                "-",
+            ]
+            result = _spawn(
+                cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+            )
+            if result.returncode != 0:
+                print(f"Pan filter failed for {direction.value}, using static crop")
+                filter_string = build_segment_filter(
+                    video_path, segment_duration, target_aspect, None
+                )
+                direction = None
+        _FILTER_CACHE[key] = (filter_string, direction)
 
-        # Add video filter
-        cmd.extend(["-vf", filter_string])
+    return _FILTER_CACHE[key]
 
-        # Add codec settings
-        if hw_encoder:
-            cmd.extend(["-c:v", hw_encoder])
-            if hw_encoder == "h264_nvenc":
-                cmd.extend(
-                    [
-                        "-preset",
-                        "p4",
-                        "-rc",
-                        "vbr",
-                        "-cq",
-                        "20",
-                        "-b:v",
-                        "10M",
-                        "-maxrate",
-                        "15M",
-                        "-bufsize",
-                        "15M",
-                        "-spatial-aq",
-                        "1",
-                        "-temporal-aq",
-                        "1",
-                    ]
+
+def create_video_segment(
+    video_path,
+    start_time,
+    segment_duration,
+    output_file,
+    target_aspect,
+    direction,
+    thread_count=None,
+    container=None,
+    text_filter=None,
+    stream_copy=False,
+):
+    """
+    Create a single video segment with the specified parameters.
+
+    thread_count overrides the detected per-process thread count, which is
+    needed when several segments are encoded at the same time.
+    container="ts" writes MPEG-TS for joining with create_concat_file.
+    text_filter is drawn on top of the segment after scaling.
+    stream_copy cuts the video without re-encoding (see can_stream_copy);
+    the cut snaps to the keyframe before start_time.
+    """
+    try:
+        if stream_copy:
+            cmd = [
+                FFMPEG,
+                "-y",
+                *FFMPEG_QUIET_ARGS,
+                "-ss",
+                str(start_time),
+                "-i",
+                video_path,
+                "-t",
+                str(segment_duration),
+                "-c:v",
+                "copy",
+                "-avoid_negative_ts",
+                "make_zero",
+                *get_segment_audio_args(video_path),
+            ]
+        else:
+            filter_string = build_segment_filter(
+                video_path, segment_duration, target_aspect, direction
+            )
+            if text_filter:
+                filter_string = f"{filter_string},{text_filter}"
+
+            # Create FFmpeg command with hardware acceleration if available
+            hw_encoder, _, detected_threads = detect_hardware_encoders()
+            # Only pin x264's threads when the caller shares the CPU with
+            # other encodes
+            x264_threads = thread_count
+            if thread_count is None:
+                thread_count = detected_threads
+
+            cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
+
+            # Add hardware acceleration if available
+            if hw_encoder and hw_encoder in _THREAD_TEMPLATES:
+                cmd.extend(get_thread_args(hw_encoder, thread_count))
+            cmd.extend(get_hw_device_args(hw_encoder))
+            if hw_encoder in HW_UPLOAD_FILTERS:
+                filter_string = f"{filter_string},{HW_UPLOAD_FILTERS[hw_encoder]}"
+
+            # Static segments on NVIDIA can be cropped/resized by NVDEC so the
+            # frames never leave GPU memory; panning still needs the CPU filter
+            gpu_decode_args = None
+            is_panning = direction and segment_duration >= 2.0
+            if hw_encoder == "h264_nvenc" and not is_panning and not text_filter:
+                gpu_decode_args = get_cuda_decode_args(
+                    video_path, target_aspect, zoom=1.2
                 )
+
+            # Add input parameters
+            cmd.extend(["-ss", str(start_time)])
+            if gpu_decode_args:
+                cmd.extend(gpu_decode_args)
             elif hw_encoder == "h264_videotoolbox":
-                cmd.extend(
-                    [
-                        "-b:v",
-                        "10M",
-                        "-maxrate",
-                        "15M",
-                        "-bufsize",
-                        "15M",
-                        "-tag:v",
-                        "avc1",
-                        "-movflags",
-                        "+faststart",
-                    ]
-                )
-        else:
-            cmd.extend(["-c:v", "libx264", "-preset", "medium", "-crf", "23"])
+                cmd.extend(["-hwaccel", "videotoolbox"])
+            cmd.extend(["-i", video_path, "-t", str(segment_duration)])
 
-        # Add audio settings
-        cmd.extend(["-c:a", "aac", "-b:a", "192k", output_file])
+            # Add video filter
+            if not gpu_decode_args:
+                cmd.extend(["-vf", filter_string])
+
+            # Add codec settings; segments are intermediate, so favour speed
+            cmd.extend(
+                get_video_encoder_args(hw_encoder, quality="fast", threads=x264_threads)
+            )
+
+            # Add keyframe and audio settings
+            cmd.extend(get_segment_stream_args(hw_encoder, video_path))
+
+        if container == "ts":
+            cmd.extend(TS_MUX_ARGS)
+        else:
+            cmd.extend(MP4_MUX_ARGS)
+        cmd.append(output_file)
 
         # Execute command with detailed error logging
         print(f"\nCreating segment with command: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True)
+        result = run_ffmpeg(cmd)
 
         if result.returncode != 0:
             print(f"FFmpeg Error Output:")
@@ -1499,6 +2150,441 @@ def create_video_segment(
         return None
 
 
+def create_single_pass_montage(
+    prefix_files,
+    segments,
+    output_path,
+    output_duration,
+    target_aspect,
+    hw_encoder=None,
+    text=None,
+    text_display_duration=5,
+    text_style="default",
+    text_motion="none",
+    intro_audio=None,
+    intro_audio_duration=5.0,
+    intro_audio_volume=2.0,
+    logo_path=None,
+    logo_fade_in=2.0,
+    logo_fade_out=2.0,
+    logo_duration=10.0,
+):
+    """
+    Build the whole montage with a single FFmpeg invocation.
+
+    Every segment is trimmed, scaled and panned inside one filter graph, then
+    concatenated and overlaid with text/logo, so the pixels are only encoded
+    once and no intermediate segment files are written.
+
+    Args:
+        prefix_files: Already processed clips (thumbnail, intro) to play first
+        segments: List of (video_path, start_time, duration, direction) tuples
+    Returns True if the output was created with the expected duration.
+    """
+    target_width = ASPECT_RATIOS[target_aspect]["width"]
+    target_height = ASPECT_RATIOS[target_aspect]["height"]
+    normalize_video = f"scale={target_width}:{target_height},setsar=1,fps=30,format=yuv420p"
+    normalize_audio = "aformat=sample_fmts=fltp:sample_rates=44100:channel_layouts=stereo"
+
+    try:
+        inputs = []
+        filter_parts = []
+        concat_labels = []
+        k = 0
+
+        # Prefix clips are already at the target size
+        for prefix_file in prefix_files:
+            inputs.extend(["-i", prefix_file])
+            filter_parts.append(f"[{k}:v]{normalize_video}[v{k}]")
+            if has_audio_stream(prefix_file):
+                filter_parts.append(f"[{k}:a]{normalize_audio}[a{k}]")
+            else:
+                prefix_duration = get_video_duration(prefix_file)
+                filter_parts.append(
+                    f"anullsrc=channel_layout=stereo:sample_rate=44100,"
+                    f"atrim=duration={prefix_duration}[a{k}]"
+                )
+            concat_labels.append(f"[v{k}][a{k}]")
+            k += 1
+
+        # Source segments: seek on the input, then trim/scale/pan in the graph
+        for video_path, start_time, duration, direction in segments:
+            inputs.extend(["-ss", str(start_time), "-t", str(duration), "-i", video_path])
+            segment_filter = build_segment_filter(
+                video_path, duration, target_aspect, direction
+            )
+            filter_parts.append(
+                f"[{k}:v]trim=duration={duration},setpts=PTS-STARTPTS,"
+                f"{segment_filter},{normalize_video}[v{k}]"
+            )
+            if has_audio_stream(video_path):
+                filter_parts.append(
+                    f"[{k}:a]atrim=duration={duration},asetpts=PTS-STARTPTS,"
+                    f"{normalize_audio}[a{k}]"
+                )
+            else:
+                filter_parts.append(
+                    f"anullsrc=channel_layout=stereo:sample_rate=44100,"
+                    f"atrim=duration={duration}[a{k}]"
+                )
+            concat_labels.append(f"[v{k}][a{k}]")
+            k += 1
+
+        filter_parts.append(
+            "".join(concat_labels) + f"concat=n={len(concat_labels)}:v=1:a=1[cv][ca]"
+        )
+        video_label = "[cv]"
+        audio_label = "[ca]"
+
+        # Text overlay
+        text_filter = create_text_overlay_filter(
+            video_duration=output_duration,
+            text=text,
+            display_duration=text_display_duration,
+            style=text_style,
+            target_aspect=target_aspect,
+            motion_type=text_motion,
+        )
+        if text_filter:
+            filter_parts.append(f"{video_label}{text_filter}[tv]")
+            video_label = "[tv]"
+
+        # Logo overlay: movie=...[logo];[0:v][logo]overlay=...[vout]
+        logo_filter = create_logo_overlay_filter(
+            video_duration=output_duration,
+            logo_path=logo_path,
+            target_aspect=target_aspect,
+            fade_in_duration=logo_fade_in,
+            fade_out_duration=logo_fade_out,
+            display_duration=logo_duration,
+        ) if logo_path else ""
+        if logo_filter:
+            logo_movie_part, logo_overlay_part = logo_filter.split(";", 1)
+            filter_parts.append(logo_movie_part)
+            filter_parts.append(logo_overlay_part.replace("[0:v]", video_label))
+        else:
+            filter_parts.append(f"{video_label}null[vout]")
+
+        # Intro audio mixing
+        if intro_audio and os.path.exists(intro_audio):
+            inputs.extend(["-i", intro_audio])
+            filter_parts.extend(
+                [
+                    # Original audio with volume adjustment after intro
+                    f"{audio_label}volume=enable='gte(t,{intro_audio_duration})':"
+                    f"volume='min(1,(t-{intro_audio_duration})/2)'[main_audio]",
+                    # Intro audio with fade out
+                    f"[{k}:a]volume={intro_audio_volume}:"
+                    f"enable='lte(t,{intro_audio_duration+2})':"
+                    f"volume='max(0,1-(t-{intro_audio_duration})/2)'[intro_audio]",
+                    # Mix both audio streams
+                    "[main_audio][intro_audio]amix=inputs=2:duration=longest[aout]",
+                ]
+            )
+            audio_label = "[aout]"
+
+        # Hand the frames to the encoder's device if it needs them there
+        video_label = "[vout]"
+        if hw_encoder in HW_UPLOAD_FILTERS:
+            filter_parts.append(f"[vout]{HW_UPLOAD_FILTERS[hw_encoder]}[vhw]")
+            video_label = "[vhw]"
+
+        cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
+        cmd.extend(get_hw_device_args(hw_encoder))
+        cmd.extend(inputs)
+        cmd.extend(["-filter_complex", ";".join(filter_parts)])
+        cmd.extend(["-map", video_label, "-map", audio_label])
+        cmd.extend(get_video_encoder_args(hw_encoder))
+        if hw_encoder not in HW_UPLOAD_FILTERS:
+            cmd.extend(["-pix_fmt", "yuv420p"])
+        cmd.extend(["-c:a", "aac", "-b:a", "192k"])
+        cmd.extend(MP4_MUX_ARGS)
+        cmd.extend(["-t", str(output_duration), output_path])
+
+        print("\nCreating montage in a single FFmpeg pass...")
+        print("Command:", " ".join(cmd))
+        result = run_ffmpeg(cmd, report_progress=True)
+
+        if result.returncode != 0:
+            print("FFmpeg Error during single-pass montage:")
+            print(result.stderr)
+            return False
+
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            print("Single-pass montage did not create an output file")
+            return False
+
+        actual_duration = get_video_duration(output_path)
+        if abs(actual_duration - output_duration) > 0.5:  # Allow 0.5s tolerance
+            print(
+                f"Warning: Single-pass output duration mismatch. Expected {output_duration}s, got {actual_duration}s"
+            )
+            return False
+
+        print(f"\nOutput video created successfully:")
+        print(f"Duration: {actual_duration:.2f}s")
+        print(f"Size: {os.path.getsize(output_path) / (1024*1024):.2f} MB")
+        return True
+
+    except Exception as e:
+        print(f"Error creating single-pass montage: {e}")
+        return False
+
+
+def _encode_segments_pynvc(segments, output_file, target_aspect, gpu_id=0):
+    """
+    Encode static (non-panning) segments with PyNvCodec, keeping a single
+    NVENC session alive across all of them, then mux the source audio in one
+    FFmpeg call. Returns the muxed file, or None so the caller can fall back
+    to the per-segment FFmpeg path.
+    """
+    target_width = ASPECT_RATIOS[target_aspect]["width"]
+    target_height = ASPECT_RATIOS[target_aspect]["height"]
+    output_fps = 30
+    video_stream = os.path.splitext(output_file)[0] + ".h264"
+
+    try:
+        nv_enc = nvc.PyNvEncoder(
+            {
+                "preset": "P1",
+                "codec": "h264",
+                "s": f"{target_width}x{target_height}",
+                "bitrate": "10M",
+                "fps": str(output_fps),
+            },
+            gpu_id,
+        )
+        packet = np.ndarray(shape=(0,), dtype=np.uint8)
+
+        with open(video_stream, "wb") as out:
+            for video_path, start_time, duration in segments:
+                nv_dec = nvc.PyNvDecoder(video_path, gpu_id)
+                input_fps = nv_dec.Framerate()
+                input_width, input_height = nv_dec.Width(), nv_dec.Height()
+
+                # Scale to fill the target frame, then centre crop
+                scale_factor = max(
+                    target_width / input_width, target_height / input_height
+                )
+                new_width = int(input_width * scale_factor) // 2 * 2
+                new_height = int(input_height * scale_factor) // 2 * 2
+                crop_x = max(0, (new_width - target_width) // 2)
+                crop_y = max(0, (new_height - target_height) // 2)
+                nv_resize = nvc.PySurfaceResizer(
+                    new_width, new_height, nv_dec.Format(), gpu_id
+                )
+
+                seek_ctx = nvc.SeekContext(seek_frame=int(start_time * input_fps))
+                surface = nv_dec.DecodeSingleSurface(seek_ctx)
+                decoded = 0
+                for frame in range(int(duration * output_fps)):
+                    # Resample the source frame rate to the output frame rate
+                    wanted = int(frame * input_fps / output_fps)
+                    while decoded < wanted:
+                        surface = nv_dec.DecodeSingleSurface()
+                        decoded += 1
+                    if surface.Empty():
+                        raise RuntimeError(f"Ran out of frames in {video_path}")
+
+                    resized = nv_resize.Execute(surface)
+                    cropped = resized.Crop(
+                        crop_x, crop_y, target_width, target_height, gpu_id
+                    )
+                    if nv_enc.EncodeSingleSurface(cropped, packet):
+                        out.write(bytearray(packet))
+
+            # Drain the packets still queued in the encoder
+            while nv_enc.FlushSinglePacket(packet):
+                out.write(bytearray(packet))
+
+        # Mux the encoded video with the matching audio from each source
+        cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS, "-r", str(output_fps), "-i", video_stream]
+        audio_parts = []
+        for k, (video_path, start_time, duration) in enumerate(segments, start=1):
+            cmd.extend(["-ss", str(start_time), "-t", str(duration), "-i", video_path])
+            if has_audio_stream(video_path):
+                audio_parts.append(f"[{k}:a]asetpts=PTS-STARTPTS[a{k}]")
+            else:
+                audio_parts.append(
+                    f"anullsrc=channel_layout=stereo:sample_rate=44100,"
+                    f"atrim=duration={duration}[a{k}]"
+                )
+        audio_parts.append(
+            "".join(f"[a{k}]" for k in range(1, len(segments) + 1))
+            + f"concat=n={len(segments)}:v=0:a=1[aout]"
+        )
+        cmd.extend(
+            [
+                "-filter_complex",
+                ";".join(audio_parts),
+                "-map",
+                "0:v",
+                "-map",
+                "[aout]",
+                "-c:v",
+                "copy",
+                "-c:a",
+                "aac",
+                "-b:a",
+                "192k",
+                "-ar",
+                "48000",
+                "-ac",
+                "2",
+                *TS_MUX_ARGS,
+                output_file,
+            ]
+        )
+        result = run_ffmpeg(cmd)
+        if result.returncode != 0:
+            print("FFmpeg Error while muxing NVENC segments:")
+            print(result.stderr)
+            return None
+
+        print(f"Encoded {len(segments)} segments with a single NVENC session")
+        return output_file
+
+    except Exception as e:
+        print(f"PyNvCodec encoding unavailable, using FFmpeg per segment: {e}")
+        return None
+
+
+def get_segment_worker_count(num_segments, hw_encoder, thread_count):
+    """
+    Decide how many segments to encode in parallel.
+    Returns a tuple of (worker_count, threads_per_worker).
+    """
+    if hw_encoder == "h264_nvenc":
+        # For NVENC the detected count is the number of parallel encode sessions
+        workers = max(1, min(num_segments, thread_count))
+        return workers, 1
+
+    total_threads = os.cpu_count() or 4
+    workers = max(1, min(num_segments, total_threads // SEGMENT_THREADS_PER_JOB))
+    return workers, max(1, total_threads // workers)
+
+
+def _encode_one_segment(args):
+    """Encode one montage segment; returns the output file or None on failure."""
+    (
+        video_path,
+        start_time,
+        duration,
+        output_file,
+        target_aspect,
+        direction,
+        threads,
+        text_filter,
+        stream_copy,
+    ) = args
+    return create_video_segment(
+        video_path=video_path,
+        start_time=start_time,
+        segment_duration=duration,
+        output_file=output_file,
+        target_aspect=target_aspect,
+        direction=direction,
+        thread_count=threads,
+        container="ts",
+        text_filter=text_filter,
+        stream_copy=stream_copy,
+    )
+
+
+def build_segment_group_command(jobs, hw_encoder):
+    """
+    Build the ffmpeg command for _encode_segment_group: one seeked input per
+    job, each mapped to its own filter, encoder settings and output file.
+    """
+    threads = jobs[0][6]
+
+    cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
+    if hw_encoder and hw_encoder in _THREAD_TEMPLATES:
+        cmd.extend(get_thread_args(hw_encoder, threads))
+    cmd.extend(get_hw_device_args(hw_encoder))
+
+    # Inputs: the same source, seeked to each segment
+    for video_path, start_time, duration, *_ in jobs:
+        cmd.extend(["-ss", str(start_time), "-t", str(duration)])
+        if hw_encoder == "h264_videotoolbox":
+            cmd.extend(["-hwaccel", "videotoolbox"])
+        cmd.extend(["-i", video_path])
+
+    # Outputs: one TS file per segment, mapped from its own input
+    for k, job in enumerate(jobs):
+        (
+            video_path,
+            _,
+            duration,
+            output_file,
+            target_aspect,
+            direction,
+            _,
+            text_filter,
+            stream_copy,
+        ) = job
+        cmd.extend(["-map", f"{k}:v:0", "-map", f"{k}:a:0?"])
+        if stream_copy:
+            cmd.extend(["-c:v", "copy", "-avoid_negative_ts", "make_zero"])
+            cmd.extend(get_segment_audio_args(video_path))
+        else:
+            filter_string = build_segment_filter(
+                video_path, duration, target_aspect, direction
+            )
+            if text_filter:
+                filter_string = f"{filter_string},{text_filter}"
+            if hw_encoder in HW_UPLOAD_FILTERS:
+                filter_string = f"{filter_string},{HW_UPLOAD_FILTERS[hw_encoder]}"
+            cmd.extend(["-filter:v", filter_string])
+            cmd.extend(get_video_encoder_args(hw_encoder, quality="fast", threads=threads))
+            cmd.extend(get_segment_stream_args(hw_encoder, video_path))
+        cmd.extend(TS_MUX_ARGS)
+        cmd.append(output_file)
+    return cmd
+
+
+def group_segment_jobs(segment_jobs, batch_size):
+    """
+    Split segment jobs into groups for _encode_segment_group: jobs from the
+    same source, in order, at most batch_size to a group.
+    """
+    groups = []
+    for _, source_jobs in itertools.groupby(
+        sorted(segment_jobs, key=lambda job: job[0]), key=lambda job: job[0]
+    ):
+        source_jobs = list(source_jobs)
+        for start in range(0, len(source_jobs), batch_size):
+            groups.append(source_jobs[start : start + batch_size])
+    return groups
+
+
+def _encode_segment_group(jobs):
+    """
+    Encode several segments from the same source with one ffmpeg process:
+    one seeked input and one output per segment, so process startup and
+    decoder init are paid once per group. Takes a list of _encode_one_segment
+    job tuples and returns their results in the same order; if the combined
+    command fails, the segments are retried one at a time.
+    """
+    if len(jobs) == 1:
+        return [_encode_one_segment(jobs[0])]
+
+    hw_encoder, _, _ = detect_hardware_encoders()
+    cmd = build_segment_group_command(jobs, hw_encoder)
+
+    print(f"\nCreating {len(jobs)} segments from {os.path.basename(jobs[0][0])} in one pass")
+    result = run_ffmpeg(cmd)
+    if result.returncode == 0 and all(
+        os.path.exists(job[3]) and os.path.getsize(job[3]) > 0 for job in jobs
+    ):
+        return [job[3] for job in jobs]
+
+    print("FFmpeg Error Output:")
+    print(result.stderr)
+    print("Retrying these segments one at a time...")
+    return [_encode_one_segment(job) for job in jobs]
+
+
 def create_video_montage(
     video_paths,
     output_duration,
@@ -1550,15 +2636,15 @@ def create_video_montage(
 
         # Process intro video if provided
         intro_segment = None
+        intro_duration = 0
         if intro_video and os.path.exists(intro_video):
             intro_segment = process_intro_segment(
                 intro_video, target_aspect, temp_dir, max_intro_length
             )
             if intro_segment:
                 segment_files.append(intro_segment)
-                print(
-                    f"Added intro video segment: {get_video_duration(intro_segment):.2f} seconds"
-                )
+                intro_duration = get_video_duration(intro_segment)
+                print(f"Added intro video segment: {intro_duration:.2f} seconds")
 
         # Detect available hardware encoder
         hw_encoder, _, thread_count = detect_hardware_encoders()
@@ -1577,7 +2663,6 @@ def create_video_montage(
 
         # Calculate segment duration to match output duration
         if intro_segment:
-            intro_duration = get_video_duration(intro_segment)
             remaining_duration = max(0, output_duration - intro_duration)
             segment_duration = remaining_duration / num_segments_needed
         else:
@@ -1585,12 +2670,21 @@ def create_video_montage(
 
         print(f"Each segment will be exactly {segment_duration:.2f} seconds")
 
-        # Extract segments from each video
+        # Extract segments from each video, asking each one only for its
+        # share of the montage plus a couple of spares for retries
+        per_video = math.ceil(num_segments_needed / max(1, len(video_paths))) + 2
         all_segments = []
         for video_path in video_paths:
+            # A video shorter than one segment has nothing to offer, so skip
+            # it before paying for the audio analysis
+            video_duration = get_video_duration(video_path)
+            if video_duration < segment_duration:
+                print(f"Skipping {os.path.basename(video_path)}: shorter than one segment")
+                continue
+
             # Get segments for this video
             segments = extract_interesting_segments(
-                video_path, num_segments_needed * 3, segment_duration
+                video_path, per_video, segment_duration, duration=video_duration
             )
 
             # Add segments with their source video
@@ -1602,8 +2696,10 @@ def create_video_montage(
         # Shuffle all segments
         random.shuffle(all_segments)
 
-        # Select unique segments with minimum spacing
+        # Select unique segments with minimum spacing; the set mirrors the
+        # list so membership checks don't rescan it
         selected_segments = []
+        used_segments = set()
         min_gap = segment_duration * 0.5  # Minimum gap between segments
 
         # First pass: Try to get segments with good spacing
@@ -1611,14 +2707,16 @@ def create_video_montage(
             # Check if this segment is too close to any already selected segment
             if not any(abs(segment[1] - s[1]) < min_gap for s in selected_segments):
                 selected_segments.append(segment)
+                used_segments.add(segment)
                 if len(selected_segments) >= num_segments_needed:
                     break
 
         # Second pass: If we don't have enough segments, add more with less strict spacing
         if len(selected_segments) < num_segments_needed:
             for segment in all_segments:
-                if segment not in selected_segments:
+                if segment not in used_segments:
                     selected_segments.append(segment)
+                    used_segments.add(segment)
                     if len(selected_segments) >= num_segments_needed:
                         break
 
@@ -1635,12 +2733,10 @@ def create_video_montage(
                 f"Segment {i+1}: {os.path.basename(video_path)} at {start_time:.2f}s for {duration:.2f}s"
             )
 
-        # Extract regular segments to temporary files
-        successful_segments = 0
-        for i, (video_path, start_time, duration) in enumerate(selected_segments):
-            segment_file = os.path.join(temp_dir, f"segment_{i:03d}.mp4")
-
-            # Determine panning direction for this segment
+        # Determine panning direction for each segment up front so the
+        # choice does not depend on the order the workers finish in
+        segment_directions = []
+        for i in range(len(selected_segments)):
             current_direction = None
             if enable_panning:
                 if pan_strategy == "random":
@@ -1650,31 +2746,168 @@ def create_video_montage(
                     current_direction = list(PanDirection)[i % len(PanDirection)]
                 elif isinstance(pan_strategy, PanDirection):
                     current_direction = pan_strategy
+            # Fall back to a static crop up front if this pan filter does
+            # not work for the source, instead of after a failed encode
+            if current_direction:
+                video_path, _, duration = selected_segments[i]
+                _, current_direction = get_checked_segment_filter(
+                    video_path, duration, target_aspect, current_direction
+                )
+            segment_directions.append(current_direction)
+
+        # Sources that are already H.264 at the target size can be cut
+        # without re-encoding. This is only done when nothing is encoded in
+        # front of them and every source has the same stream parameters,
+        # so all the pieces being joined decode as one stream.
+        copy_sources = {segment[0] for segment in selected_segments}
+        copy_segments = (
+            not segment_files
+            and not any(segment_directions)
+            and can_stream_copy_together(copy_sources, target_aspect)
+        )
 
-            # Create segment using the panning approach
-            result = create_video_segment(
-                video_path=video_path,
-                start_time=start_time,
-                segment_duration=duration,
-                output_file=segment_file,
-                target_aspect=target_aspect,
-                direction=current_direction,
+        # Build everything in one FFmpeg pass when possible; the per-segment
+        # pipeline below is kept as a fallback
+        if not copy_segments and create_single_pass_montage(
+            prefix_files=list(segment_files),
+            segments=[
+                (video_path, start_time, duration, segment_directions[i])
+                for i, (video_path, start_time, duration) in enumerate(selected_segments)
+            ],
+            output_path=output_path,
+            output_duration=output_duration,
+            target_aspect=target_aspect,
+            hw_encoder=hw_encoder,
+            text=text,
+            text_display_duration=text_display_duration,
+            text_style=text_style,
+            text_motion=text_motion,
+            intro_audio=intro_audio,
+            intro_audio_duration=intro_audio_duration,
+            intro_audio_volume=intro_audio_volume,
+            logo_path=logo_path,
+            logo_fade_in=logo_fade_in,
+            logo_fade_out=logo_fade_out,
+            logo_duration=logo_duration,
+        ):
+            return
+
+        if copy_segments:
+            print("Sources already match the target format, cutting segments without re-encoding...")
+        else:
+            print("Single-pass montage failed, falling back to per-segment encoding...")
+
+        # On NVIDIA GPUs, push static segments through one persistent NVENC
+        # session instead of spawning an ffmpeg process per segment
+        nvenc_segments = None
+        if (
+            hw_encoder == "h264_nvenc"
+            and nvc is not None
+            and not any(segment_directions)
+            and not copy_segments
+        ):
+            nvenc_segments = _encode_segments_pynvc(
+                selected_segments,
+                os.path.join(temp_dir, "segments_nvenc.ts"),
+                target_aspect,
             )
 
-            if result:
-                actual_duration = get_video_duration(segment_file)
-                print(
-                    f"Segment {i+1}/{len(selected_segments)} created successfully. Duration: {actual_duration:.2f}s"
+        # Without a thumbnail or intro in front, draw the text while encoding
+        # each segment, shifted to its place in the montage, so the final
+        # step does not have to decode and re-encode the whole video
+        text_in_segments = (
+            bool(text) and not segment_files and not nvenc_segments and not copy_segments
+        )
+        segment_text_filters = [None] * len(selected_segments)
+        if text_in_segments:
+            segment_text_filters = [
+                create_text_overlay_filter(
+                    video_duration=output_duration,
+                    text=text,
+                    display_duration=text_display_duration,
+                    style=text_style,
+                    target_aspect=target_aspect,
+                    motion_type=text_motion,
+                    start_offset=i * segment_duration,
                 )
-                if current_direction:
-                    print(f"Using panning direction: {current_direction.value}")
-                segment_files.append(segment_file)
-                successful_segments += 1
+                for i in range(len(selected_segments))
+            ]
+        final_text = None if text_in_segments else text
+
+        if nvenc_segments:
+            segment_files.append(nvenc_segments)
+            successful_segments = len(selected_segments)
+        else:
+            # Segments are independent, so encode several of them at once
+            workers, threads_per_worker = get_segment_worker_count(
+                len(selected_segments), hw_encoder, thread_count
+            )
+            print(
+                f"Encoding segments with {workers} parallel job(s), {threads_per_worker} thread(s) each"
+            )
+            segment_jobs = [
+                (
+                    video_path,
+                    start_time,
+                    duration,
+                    os.path.join(temp_dir, f"segment_{i:03d}.ts"),
+                    target_aspect,
+                    segment_directions[i],
+                    threads_per_worker,
+                    segment_text_filters[i],
+                    copy_segments,
+                )
+                for i, (video_path, start_time, duration) in enumerate(selected_segments)
+            ]
+
+            # Batch segments that share a source into one ffmpeg process each,
+            # keeping the batches small enough that every worker gets one.
+            # NVENC keeps one segment per process to respect its session
+            # limit and to use the NVDEC crop/resize path.
+            if hw_encoder == "h264_nvenc":
+                batch_size = 1
             else:
-                print(f"Warning: Failed to create segment {i+1}")
-                # Try again with a different segment
-                for alt_segment in all_segments:
-                    if alt_segment not in selected_segments:
+                batch_size = max(1, math.ceil(len(segment_jobs) / workers))
+            groups = group_segment_jobs(segment_jobs, batch_size)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                group_results = list(executor.map(_encode_segment_group, groups))
+
+            # Put the results back in montage order
+            results_by_file = {
+                job[3]: result
+                for group, group_result in zip(groups, group_results)
+                for job, result in zip(group, group_result)
+            }
+            results = [results_by_file[job[3]] for job in segment_jobs]
+
+            # Collect results in montage order, retrying failures one at a time
+            successful_segments = 0
+            for i, (job, result) in enumerate(zip(segment_jobs, results)):
+                segment_file = job[3]
+                current_direction = job[5]
+                duration = job[2]
+
+                if result:
+                    # ffmpeg honoured -t if it exited cleanly, no need to re-probe
+                    print(
+                        f"Segment {i+1}/{len(selected_segments)} created successfully. Duration: {duration:.2f}s"
+                    )
+                    if current_direction:
+                        print(f"Using panning direction: {current_direction.value}")
+                    segment_files.append(segment_file)
+                    successful_segments += 1
+                else:
+                    print(f"Warning: Failed to create segment {i+1}")
+                    # Try again with a different segment
+                    for alt_segment in all_segments:
+                        if alt_segment in used_segments:
+                            continue
+                        # A copied montage can only take copyable sources
+                        if job[8] and not can_stream_copy_together(
+                            copy_sources | {alt_segment[0]}, target_aspect
+                        ):
+                            continue
                         alt_result = create_video_segment(
                             video_path=alt_segment[0],
                             start_time=alt_segment[1],
@@ -1682,12 +2915,15 @@ def create_video_montage(
                             output_file=segment_file,
                             target_aspect=target_aspect,
                             direction=current_direction,
+                            container="ts",
+                            text_filter=job[7],
+                            stream_copy=job[8],
                         )
                         if alt_result:
-                            actual_duration = get_video_duration(segment_file)
                             print(
-                                f"Alternative segment created successfully. Duration: {actual_duration:.2f}s"
+                                f"Alternative segment created successfully. Duration: {duration:.2f}s"
                             )
+                            used_segments.add(alt_segment)
                             segment_files.append(segment_file)
                             successful_segments += 1
                             break
@@ -1701,29 +2937,38 @@ def create_video_montage(
             raise Exception("No valid segments were created. Cannot create montage.")
 
         try:
-            # Create concat file
-            temp_output = create_concat_file(segment_files, temp_dir)
+            # Add text overlay
+            text_filter = create_text_overlay_filter(
+                video_duration=output_duration,
+                text=final_text,
+                display_duration=text_display_duration,
+                style=text_style,
+                target_aspect=target_aspect,
+                motion_type=text_motion,
+            )
 
-            if temp_output:
-                # Add text overlay
-                text_filter = create_text_overlay_filter(
-                    video_duration=output_duration,
-                    text=text,
-                    display_duration=text_display_duration,
-                    style=text_style,
-                    target_aspect=target_aspect,
-                    motion_type=text_motion,
-                )
+            # Add logo overlay if provided
+            logo_filter = create_logo_overlay_filter(
+                video_duration=output_duration,
+                logo_path=logo_path,
+                target_aspect=target_aspect,
+                fade_in_duration=logo_fade_in,
+                fade_out_duration=logo_fade_out,
+                display_duration=logo_duration,
+            )
 
-                # Add logo overlay if provided
-                logo_filter = create_logo_overlay_filter(
-                    video_duration=output_duration,
-                    logo_path=logo_path,
-                    target_aspect=target_aspect,
-                    fade_in_duration=logo_fade_in,
-                    fade_out_duration=logo_fade_out,
-                    display_duration=logo_duration,
-                )
+            # With nothing left to draw or mix, concatenate straight into the
+            # output instead of writing an intermediate file and remuxing it
+            needs_final_pass = bool(
+                text_filter
+                or logo_filter
+                or (intro_audio and os.path.exists(intro_audio))
+            )
+            if needs_final_pass:
+                # The final pass re-encodes anyway, so read the segments
+                # straight from the concat input instead of joining them
+                # into an intermediate file first
+                concat_input, concat_list = get_concat_input_args(segment_files)
 
                 # Set target dimensions
                 target_width = ASPECT_RATIOS[target_aspect]["width"]
@@ -1731,7 +2976,7 @@ def create_video_montage(
 
                 # Prepare final FFmpeg command
                 filter_complex = []
-                inputs = ["-i", temp_output]
+                inputs = list(concat_input)
 
                 # Add intro audio if provided
                 if intro_audio and os.path.exists(intro_audio):
@@ -1752,9 +2997,13 @@ def create_video_montage(
                         ]
                     )
 
+                # Text, logo and intro audio mixing share one filter graph
+                cmd = [FFMPEG, "-y", *FFMPEG_QUIET_ARGS]
+                cmd.extend(inputs)
+
                 # Handle text and logo filters
                 if text_filter or logo_filter:
-                    filter_parts = []
+                    filter_parts = filter_complex
                     input_label = "[0:v]"
 
                     # Apply text filter if present
@@ -1780,10 +3029,11 @@ def create_video_montage(
                         # If no logo, just output the last label as [vout]
                         filter_parts.append(f"{input_label}null[vout]")
 
-                    filter_complex_str = ";".join(filter_parts)
-                    cmd.extend(["-filter_complex", filter_complex_str])
+                    cmd.extend(["-filter_complex", ";".join(filter_parts)])
                     cmd.extend(["-map", "[vout]"])
                 else:
+                    if filter_complex:
+                        cmd.extend(["-filter_complex", ";".join(filter_complex)])
                     cmd.extend(["-map", "0:v"])
 
                 # Map audio based on whether we have intro audio
@@ -1806,18 +3056,15 @@ def create_video_montage(
                     "-movflags", "+faststart",  # Enable fast start for QuickTime
                     "-tag:v", "avc1",  # Force H.264 tag for QuickTime
                     "-brand", "mp42",  # Set brand for better QuickTime compatibility
-                    "-t", str(video_duration),
+                    "-c:a", "aac",
+                    "-b:a", "192k",
+                    "-t", str(output_duration),
                     output_path
                 ])
 
                 print(f"\nExecuting final FFmpeg command to create: {output_path}")
                 print("Command:", " ".join(cmd))
-                result = subprocess.run(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                )
+                result = run_ffmpeg(cmd, input=concat_list, report_progress=True)
 
                 if result.returncode != 0:
                     print("FFmpeg Error:")
@@ -1825,7 +3072,19 @@ def create_video_montage(
                     raise Exception(
                         f"FFmpeg failed with return code {result.returncode}"
                     )
+                output_created = True
+            else:
+                output_created = (
+                    create_concat_file(
+                        segment_files,
+                        temp_dir,
+                        output_file=output_path,
+                        duration=output_duration,
+                    )
+                    is not None
+                )
 
+            if output_created:
                 # Verify the output file
                 if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                     actual_duration = get_video_duration(output_path)
@@ -1853,7 +3112,7 @@ def create_video_montage(
                     output_path=output_path,
                     video_duration=output_duration,
                     target_aspect=target_aspect,
-                    text=text,
+                    text=final_text,
                     text_style=text_style,
                     text_motion=text_motion,
                     text_display_duration=text_display_duration,
@@ -1875,7 +3134,7 @@ def create_video_montage(
                 output_path=output_path,
                 video_duration=output_duration,
                 target_aspect=target_aspect,
-                text=text,
+                text=final_text,
                 text_style=text_style,
                 text_motion=text_motion,
                 text_display_duration=text_display_duration,
@@ -1929,7 +3188,7 @@ def process_thumbnail(thumbnail_path, target_aspect, temp_dir, duration=1.0, sca
     target_height = ASPECT_RATIOS[target_aspect]["height"]
 
     # Create output path for processed thumbnail
-    processed_thumbnail = os.path.join(temp_dir, "processed_thumbnail.mp4")
+    processed_thumbnail = os.path.join(temp_dir, "processed_thumbnail.ts")
 
     try:
         # Determine scaling filter based on mode
@@ -1946,23 +3205,27 @@ def process_thumbnail(thumbnail_path, target_aspect, temp_dir, duration=1.0, sca
                 f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2"
             )
 
-        # Create a video from the thumbnail with no audio
+        # Create a video from the thumbnail with a silent audio track, so
+        # it can be byte-concatenated with the other MPEG-TS segments
         cmd = [
-            "ffmpeg", "-y",
+            FFMPEG, "-y",
+            *FFMPEG_QUIET_ARGS,
             "-loop", "1",
             "-i", thumbnail_path,
+            "-f", "lavfi",
+            "-i", "anullsrc=channel_layout=stereo:sample_rate=48000",
             "-vf", scale_filter,
             "-t", str(duration),
             "-c:v", "libx264",
             "-preset", "medium",
             "-crf", "23",
-            "-an",  # No audio
+            "-c:a", "aac",
+            "-b:a", "192k",
+            *TS_MUX_ARGS,
             processed_thumbnail
         ]
 
-        result = subprocess.run(
-            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
-        )
+        result = run_ffmpeg(cmd)
 
         if result.returncode != 0:
             print(f"Warning: Failed to process thumbnail: {result.stderr}")
@@ -1975,7 +3238,8 @@ def process_thumbnail(thumbnail_path, target_aspect, temp_dir, duration=1.0, sca
         return None
 
 
-def main():
+def build_parser():
+    """Build the command line parser, also used for --batch jobs."""
     parser = argparse.ArgumentParser(
         description="Create an exciting video montage from input videos for social media."
     )
@@ -1984,13 +3248,12 @@ def main():
         "-i",
         help='Input string in format: "output_name, format, video1, video2, ..."',
     )
-    parser.add_argument("--output", "-o", required=True, help="Output video file")
+    parser.add_argument("--output", "-o", help="Output video file (required)")
     parser.add_argument(
         "--format",
         "-f",
-        required=True,
         choices=["vertical_portrait", "instagram_square"],
-        help="Output video format/aspect ratio",
+        help="Output video format/aspect ratio (required)",
     )
     parser.add_argument(
         "--duration",
@@ -2108,35 +3371,117 @@ def main():
         default=1.0,
         help="Duration of the thumbnail in seconds (default: 1.0)"
     )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=FFMPEG_STALL_TIMEOUT,
+        help=f"Kill an ffmpeg run that reports no progress for this many seconds (default: {FFMPEG_STALL_TIMEOUT}, 0 disables)",
+    )
+    parser.add_argument(
+        "--ffmpeg-timeout",
+        type=float,
+        help="Kill any single ffmpeg run that takes longer than this many seconds (default: no limit)",
+    )
+    parser.add_argument(
+        "--batch",
+        help="JSON file with a list of jobs to run in one process; each job maps option names (e.g. output, format, panning, input_video) to values",
+    )
     parser.add_argument(
         "--thumbnail-scale",
         choices=["fit", "fill"],
         default="fit",
         help="How to scale the thumbnail: 'fit' maintains aspect ratio with padding, 'fill' fills the frame and crops (default: fit)"
     )
+    return parser
+
+
+def main():
+    global FFMPEG_STALL_TIMEOUT, FFMPEG_TIMEOUT
 
+    parser = build_parser()
     args = parser.parse_args()
 
-    # Validate intro video length
-    if args.intro_video_length < 5 or args.intro_video_length > 30:
-        print("Error: Intro video length must be between 5 and 30 seconds")
-        sys.exit(1)
+    # Watchdog limits for every run_ffmpeg call
+    FFMPEG_STALL_TIMEOUT = args.stall_timeout
+    FFMPEG_TIMEOUT = args.ffmpeg_timeout
+
+    # A batch runs every job in this process, so FFmpeg checks and caches
+    # are shared instead of paid once per invocation
+    if args.batch:
+        try:
+            with open(args.batch, "r") as f:
+                jobs = [parser.parse_args(batch_job_argv(job)) for job in json.load(f)]
+        except (OSError, ValueError) as e:
+            print(f"Error reading batch file {args.batch}: {e}")
+            sys.exit(1)
+    else:
+        jobs = [args]
+    for job in jobs:
+        if not job.output or not job.format:
+            parser.error("the following arguments are required: -o/--output, -f/--format")
 
     if not check_ffmpeg():
         sys.exit(1)
 
+    # Test filters before starting the main processing
+    print("Testing filter compatibility with your FFmpeg installation...")
+    working_filters = generate_and_test_filters()
+    if not working_filters:
+        print("Warning: No working pan filters found. Will use static filters only.")
+    else:
+        print(f"Found {len(working_filters)} working filter configurations.")
+
+    failed = 0
+    for index, job in enumerate(jobs, 1):
+        if len(jobs) > 1:
+            print(f"\n=== Job {index}/{len(jobs)}: {job.output} ===")
+        if not run_montage_job(job):
+            failed += 1
+
+    if failed:
+        if len(jobs) > 1:
+            print(f"{failed} of {len(jobs)} jobs failed")
+        sys.exit(1)
+
+
+def batch_job_argv(job):
+    """
+    Turn one --batch job (option name -> value) into command line arguments.
+    True adds a bare flag, False/None leave the option out, and input_video
+    is passed as the positional input.
+    """
+    argv = []
+    for name, value in job.items():
+        if name == "input_video" or value is None or value is False:
+            continue
+        option = "--" + name.replace("_", "-")
+        if value is True:
+            argv.append(option)
+        else:
+            argv.extend([option, str(value)])
+    if job.get("input_video"):
+        argv.append(job["input_video"])
+    return argv
+
+
+def run_montage_job(args):
+    """Create one montage from parsed arguments. Returns True on success."""
+    # Validate intro video length
+    if args.intro_video_length < 5 or args.intro_video_length > 30:
+        print("Error: Intro video length must be between 5 and 30 seconds")
+        return False
+
     # Check if input video is provided
     if not args.input_video:
         print("Error: Input video file is required")
-        parser.print_help()
-        sys.exit(1)
+        return False
 
     # Use the input video directly
     videos = [args.input_video]
 
     categorized_videos = validate_inputs(videos)
     if not categorized_videos:
-        sys.exit(1)
+        return False
 
     # Flatten the list of videos
     all_videos = []
@@ -2156,17 +3501,6 @@ def main():
         pan_strategy = PanDirection(pan_strategy)
 
     try:
-        # Test filters before starting the main processing
-        print("Testing filter compatibility with your FFmpeg installation...")
-        working_filters = generate_and_test_filters()
-        if not working_filters:
-            print(
-                "Warning: No working pan filters found. Will use static filters only."
-            )
-            enable_panning = False
-        else:
-            print(f"Found {len(working_filters)} working filter configurations.")
-
         # Modify output filename to include text style and duration
         output_path = args.output
         if output_path:
@@ -2219,9 +3553,10 @@ def main():
         else:
             print(f"Warning: File was not found at: {abs_output_path}")
             print("The operation may have failed or saved to a different location.")
+        return True
     except Exception as e:
         print(f"Error creating video montage: {e}")
-        sys.exit(1)
+        return False
 
 
 if __name__ == "__main__":
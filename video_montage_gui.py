@@ -1,10 +1,118 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-import subprocess
+import asyncio
+import json
 import os
+import shlex
+import signal
+import subprocess
 import sys
+import tempfile
 import threading
 
+# Optional: Numba compiles the progress parser to machine code
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Script output is shown in the log at most once per this many milliseconds
+OUTPUT_FLUSH_MS = 16
+
+# The output log keeps only this many of the most recent lines
+MAX_OUTPUT_LINES = 5000
+
+# No console window for the script on Windows; elsewhere it gets its own
+# session so Cancel can signal it and its ffmpeg children as one group
+if os.name == "nt":
+    PROCESS_FLAGS = {"creationflags": subprocess.CREATE_NO_WINDOW}
+else:
+    PROCESS_FLAGS = {"start_new_session": True}
+
+# File dialog filters
+VIDEO_TYPES = (("Video files", "*.mp4 *.mov *.avi *.mkv *.wmv *.flv *.webm"), ("All files", "*.*"))
+AUDIO_TYPES = (("Audio files", "*.mp3 *.wav *.aac *.m4a *.flac"), ("All files", "*.*"))
+PNG_TYPES = (("PNG files", "*.png"), ("All files", "*.*"))
+MP4_TYPES = (("MP4 files", "*.mp4"), ("All files", "*.*"))
+
+# Step interval of the busy progress bar; ttk's default of 50 ms redraws the
+# window 20 times a second for the whole render
+PROGRESS_INTERVAL_MS = 200
+
+def format_command(cmd):
+    """Quote a command list the way the user's shell would need it."""
+    if os.name == "nt":
+        return subprocess.list2cmdline(cmd)
+    return shlex.join(cmd)
+
+def parse_ffmpeg_progress(buf):
+    """
+    Return the position in seconds of the last "time=HH:MM:SS.xx" in the
+    bytes buf, or -1.0 if there is none.
+    """
+    n = len(buf)
+    i = n - 5
+    while i >= 0:
+        # b"time="
+        if (buf[i] == 116 and buf[i + 1] == 105 and buf[i + 2] == 109
+                and buf[i + 3] == 101 and buf[i + 4] == 61):
+            seconds = 0.0
+            field = 0.0
+            scale = 0.0  # place value of the next digit after the "."
+            j = i + 5
+            while j < n:
+                c = buf[j]
+                if 48 <= c <= 57:
+                    if scale > 0.0:
+                        field += (c - 48) * scale
+                        scale /= 10.0
+                    else:
+                        field = field * 10.0 + (c - 48)
+                elif c == 58 and scale == 0.0:  # ":"
+                    seconds = (seconds + field) * 60.0
+                    field = 0.0
+                elif c == 46 and scale == 0.0:  # "."
+                    scale = 0.1
+                else:
+                    break
+                j += 1
+            if j > i + 5:
+                return seconds + field
+        i -= 1
+    return -1.0
+
+if njit is not None:
+    parse_ffmpeg_progress = njit(cache=True)(parse_ffmpeg_progress)
+
+class OutputProtocol(asyncio.SubprocessProtocol):
+    """
+    Passes every read from the script's output pipe straight to on_output.
+    The event loop delivers whatever one read returned, so a burst of output
+    costs one wakeup and one read instead of one per line.
+    """
+    def __init__(self, on_output, finished):
+        self.on_output = on_output
+        self.finished = finished
+        self.partial = b""
+
+    def pipe_data_received(self, fd, data):
+        # Pass on the complete lines of each read, decoded in one go; the
+        # unfinished tail waits for its newline, so neither a progress line
+        # nor a multi-byte character is ever split
+        data = self.partial + data
+        end = data.rfind(b"\n") + 1
+        self.partial = data[end:]
+        if end:
+            self.on_output(data[:end].decode("utf-8", errors="replace"))
+
+    def connection_lost(self, exc):
+        # Called once the process has exited and its pipes are closed
+        if self.partial:
+            self.on_output(self.partial.decode("utf-8", errors="replace"))
+            self.partial = b""
+        if not self.finished.done():
+            self.finished.set_result(None)
+
 class VideoMontageCreatorGUI:
     def __init__(self, root):
         self.root = root
@@ -33,12 +141,57 @@ class VideoMontageCreatorGUI:
         self.intro_video_length = tk.IntVar(value=5)
         self.intro_audio_path = tk.StringVar()
         
+        # All form values by name, so they can be read in one pass
+        self._vars = {
+            name: getattr(self, name)
+            for name in ("input_video", "output_file", "format", "duration",
+                         "segments", "panning", "pan_strategy", "pan_speed",
+                         "pan_distance", "easing", "text", "text_style",
+                         "logo_path", "intro_video_path", "intro_video_length",
+                         "intro_audio_path")
+        }
+        
+        # Rebuild the command only after one of the form values changed
+        self._cmd_dirty = True
+        self._cached_cmd = None
+        for var in self._vars.values():
+            var.trace_add("write", self.mark_command_dirty)
+        
         # Create UI frame
         self.create_ui()
         
         # Status variables
         self.processing = False
         self.command_output = ""
+        
+        # Jobs waiting for "Run Queue", in the --batch format of the script
+        self.job_queue = []
+        
+        # Output directory already created/checked by validate_form
+        self._last_validated_dir = None
+        
+        # Transports of the script processes still running, for Cancel, and
+        # the pids the user cancelled
+        self._running = set()
+        self._cancelled = set()
+        
+        # Length of the montage being rendered, for the progress bar; None
+        # for a batch, which has no single timeline
+        self._progress_total = None
+        
+        # Output read since the last flush to the log
+        self._pending_output = []
+        self._flush_scheduled = False
+        self._output_lock = threading.Lock()
+        
+        # Event loop that runs the montage processes off the Tk thread
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        
+        # Compile (or load from numba's cache) the progress parser now, off
+        # the Tk thread, so the first progress line of a run does not stall
+        # the window
+        threading.Thread(target=parse_ffmpeg_progress, args=(b"",), daemon=True).start()
 
     def create_ui(self):
         # Create notebook for tab organization
@@ -54,17 +207,20 @@ class VideoMontageCreatorGUI:
         notebook.add(advanced_frame, text="Advanced Settings")
         
         # Output tab
-        output_frame = ttk.Frame(notebook, padding=10)
-        notebook.add(output_frame, text="Output")
+        self.output_frame = ttk.Frame(notebook, padding=10)
+        notebook.add(self.output_frame, text="Output")
         
         # Build the main settings tab
         self.build_main_settings(main_frame)
         
-        # Build the advanced settings tab
-        self.build_advanced_settings(advanced_frame)
-        
-        # Build the output tab
-        self.build_output_tab(output_frame)
+        # The advanced settings and output tabs are built the first time
+        # they are shown (or the output widgets are needed)
+        self.notebook = notebook
+        self._lazy_tabs = {
+            str(advanced_frame): self.build_advanced_settings,
+            str(self.output_frame): self.build_output_tab,
+        }
+        notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
         
         # Add run button at the bottom
         run_frame = ttk.Frame(self.root, padding=(0, 10))
@@ -78,6 +234,28 @@ class VideoMontageCreatorGUI:
         
         preview_button = ttk.Button(run_frame, text="Preview Command", command=self.preview_command)
         preview_button.pack(side=tk.RIGHT, padx=5)
+        
+        cancel_button = ttk.Button(run_frame, text="Cancel", command=self.cancel_run)
+        cancel_button.pack(side=tk.RIGHT, padx=5)
+        
+        # Queue several montages and render them in one script run
+        run_queue_button = ttk.Button(run_frame, text="Run Queue", command=self.run_queue)
+        run_queue_button.pack(side=tk.RIGHT, padx=5)
+        
+        queue_button = ttk.Button(run_frame, text="Add to Queue", command=self.add_to_queue)
+        queue_button.pack(side=tk.RIGHT, padx=5)
+        
+        self.queue_label = ttk.Label(run_frame, text="Queue: 0 jobs")
+        self.queue_label.pack(side=tk.LEFT, padx=5)
+
+    def on_tab_changed(self, event):
+        self.build_tab(self.root.nametowidget(self.notebook.select()))
+
+    def build_tab(self, frame):
+        # Build a lazily created tab once
+        builder = self._lazy_tabs.pop(str(frame), None)
+        if builder:
+            builder(frame)
 
     def build_main_settings(self, parent):
         # Input and output file selection
@@ -248,7 +426,7 @@ class VideoMontageCreatorGUI:
         output_label = ttk.Label(parent, text="Output Log:")
         output_label.pack(anchor=tk.W, pady=(10, 5))
         
-        self.output_text = tk.Text(parent, height=15, wrap=tk.WORD)
+        self.output_text = tk.Text(parent, height=15, wrap=tk.WORD, state=tk.DISABLED)
         self.output_text.pack(fill=tk.BOTH, expand=True)
         
         # Add scrollbar to output text
@@ -257,10 +435,7 @@ class VideoMontageCreatorGUI:
         self.output_text.config(yscrollcommand=output_scrollbar.set)
 
     def browse_input(self):
-        filename = filedialog.askopenfilename(filetypes=[
-            ("Video files", "*.mp4 *.mov *.avi *.mkv *.wmv *.flv *.webm"),
-            ("All files", "*.*")
-        ])
+        filename = filedialog.askopenfilename(filetypes=VIDEO_TYPES)
         if filename:
             self.input_video.set(filename)
             # Suggest output filename
@@ -273,169 +448,305 @@ class VideoMontageCreatorGUI:
     def browse_output(self):
         filename = filedialog.asksaveasfilename(
             defaultextension=".mp4",
-            filetypes=[("MP4 files", "*.mp4"), ("All files", "*.*")]
+            filetypes=MP4_TYPES
         )
         if filename:
             self.output_file.set(filename)
 
     def browse_logo(self):
-        filename = filedialog.askopenfilename(filetypes=[
-            ("PNG files", "*.png"),
-            ("All files", "*.*")
-        ])
+        filename = filedialog.askopenfilename(filetypes=PNG_TYPES)
         if filename:
             self.logo_path.set(filename)
 
     def browse_intro_video(self):
-        filename = filedialog.askopenfilename(filetypes=[
-            ("Video files", "*.mp4 *.mov *.avi *.mkv *.wmv *.flv *.webm"),
-            ("All files", "*.*")
-        ])
+        filename = filedialog.askopenfilename(filetypes=VIDEO_TYPES)
         if filename:
             self.intro_video_path.set(filename)
 
     def browse_intro_audio(self):
-        filename = filedialog.askopenfilename(filetypes=[
-            ("Audio files", "*.mp3 *.wav *.aac *.m4a *.flac"),
-            ("All files", "*.*")
-        ])
+        filename = filedialog.askopenfilename(filetypes=AUDIO_TYPES)
         if filename:
             self.intro_audio_path.set(filename)
 
     def preview_command(self):
+        # The Tk variables are read here on the Tk thread; quoting happens
+        # on a worker and only the finished string comes back
         cmd = self.build_command()
+        self.build_tab(self.output_frame)
+        threading.Thread(target=self.preview_worker, args=(cmd,), daemon=True).start()
+
+    def preview_worker(self, cmd):
+        self.root.after(0, self.install_preview, format_command(cmd))
+
+    def install_preview(self, text):
         self.command_preview.delete(1.0, tk.END)
-        self.command_preview.insert(tk.END, " ".join(cmd))
+        self.command_preview.insert(tk.END, text)
 
-    def build_command(self):
-        # Start with the basic command
-        cmd = [sys.executable, self.script_path]
+    def build_job(self):
+        # Option name -> value, the form video_editor_script.py --batch reads
+        job = {}
+        
+        # Read every form value once
+        vals = {name: var.get() for name, var in self._vars.items()}
         
         # Add output file
-        if self.output_file.get():
-            cmd.extend(["-o", self.output_file.get()])
+        if vals["output_file"]:
+            job["output"] = vals["output_file"]
         
         # Add format
-        if self.format.get():
-            cmd.extend(["-f", self.format.get()])
+        if vals["format"]:
+            job["format"] = vals["format"]
         
         # Add duration
-        cmd.extend(["-d", str(self.duration.get())])
+        job["duration"] = vals["duration"]
         
         # Add segments if specified
-        if self.segments.get():
-            cmd.extend(["--segments", self.segments.get()])
+        if vals["segments"]:
+            job["segments"] = vals["segments"]
         
         # Add panning settings if enabled
-        if self.panning.get():
-            cmd.append("--panning")
-            cmd.extend(["--pan-strategy", self.pan_strategy.get()])
-            cmd.extend(["--pan-speed", str(self.pan_speed.get())])
-            cmd.extend(["--pan-distance", str(self.pan_distance.get())])
-            cmd.extend(["--easing", self.easing.get()])
+        if vals["panning"]:
+            job["panning"] = True
+            job["pan_strategy"] = vals["pan_strategy"]
+            job["pan_speed"] = vals["pan_speed"]
+            job["pan_distance"] = vals["pan_distance"]
+            job["easing"] = vals["easing"]
         
         # Add text overlay if specified
-        if self.text.get():
-            cmd.extend(["--text", self.text.get()])
-            cmd.extend(["--text-style", self.text_style.get()])
+        if vals["text"]:
+            job["text"] = vals["text"]
+            job["text_style"] = vals["text_style"]
         
         # Add logo if specified
-        if self.logo_path.get():
-            cmd.extend(["--logo", self.logo_path.get()])
+        if vals["logo_path"]:
+            job["logo"] = vals["logo_path"]
         
         # Add intro video if specified
-        if self.intro_video_path.get():
-            cmd.extend(["--intro-video", self.intro_video_path.get()])
-            cmd.extend(["--intro-video-length", str(self.intro_video_length.get())])
+        if vals["intro_video_path"]:
+            job["intro_video"] = vals["intro_video_path"]
+            job["intro_video_length"] = vals["intro_video_length"]
         
         # Add intro audio if specified
-        if self.intro_audio_path.get():
-            cmd.extend(["--intro-audio", self.intro_audio_path.get()])
+        if vals["intro_audio_path"]:
+            job["intro_audio"] = vals["intro_audio_path"]
+        
+        # Add input video
+        if vals["input_video"]:
+            job["input_video"] = vals["input_video"]
+        
+        return job
+
+    def mark_command_dirty(self, *args):
+        self._cmd_dirty = True
+
+    def build_command(self):
+        # Reuse the last command while no form value has changed
+        if not self._cmd_dirty and self._cached_cmd is not None:
+            return self._cached_cmd
+        
+        # Start with the basic command
+        cmd = [sys.executable, self.script_path]
+        job = self.build_job()
+        
+        # Options in the order they were added, flags without a value
+        for name, value in job.items():
+            if name == "input_video":
+                continue
+            option = "--" + name.replace("_", "-")
+            if value is True:
+                cmd.append(option)
+            else:
+                cmd.extend([option, str(value)])
         
         # Add input video as the last argument
-        if self.input_video.get():
-            cmd.append(self.input_video.get())
+        if "input_video" in job:
+            cmd.append(job["input_video"])
         
+        self._cached_cmd = cmd
+        self._cmd_dirty = False
         return cmd
 
-    def run_script(self):
+    def validate_form(self):
         # Validate required fields
         if not self.input_video.get():
             messagebox.showerror("Error", "Input video is required")
-            return
+            return False
         
         if not self.output_file.get():
             messagebox.showerror("Error", "Output file is required")
-            return
+            return False
         
-        # Check if output directory exists
+        # Make sure the output directory exists; repeat runs into the same
+        # directory skip the check
         output_dir = os.path.dirname(self.output_file.get())
-        if output_dir and not os.path.exists(output_dir):
+        if output_dir and output_dir != self._last_validated_dir:
             try:
-                os.makedirs(output_dir)
-            except Exception as e:
+                os.makedirs(output_dir, exist_ok=True)
+                self._last_validated_dir = output_dir
+            except OSError as e:
                 messagebox.showerror("Error", f"Could not create output directory: {str(e)}")
-                return
+                return False
+        
+        return True
+
+    def run_script(self):
+        if not self.validate_form():
+            return
         
         # Build the command
-        cmd = self.build_command()
+        self.start_command(self.build_command())
+
+    def add_to_queue(self):
+        if not self.validate_form():
+            return
+        
+        self.job_queue.append(self.build_job())
+        self.queue_label.config(text=f"Queue: {len(self.job_queue)} jobs")
+        self.build_tab(self.output_frame)
+        self.append_output(f"Queued: {self.output_file.get()}\n")
+
+    def run_queue(self):
+        if not self.job_queue:
+            messagebox.showerror("Error", "The queue is empty")
+            return
+        
+        # All queued jobs run in one script process via --batch
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(self.job_queue, f)
+            batch_file = f.name
+        self.job_queue = []
+        self.queue_label.config(text="Queue: 0 jobs")
+        
+        self.start_command([sys.executable, self.script_path, "--batch", batch_file], batch_file)
+
+    def start_command(self, cmd, batch_file=None):
+        self.build_tab(self.output_frame)
         
         # Show command preview
-        self.command_preview.delete(1.0, tk.END)
-        self.command_preview.insert(tk.END, " ".join(cmd))
+        self.install_preview(format_command(cmd))
         
         # Clear previous output
+        self.output_text.config(state=tk.NORMAL)
         self.output_text.delete(1.0, tk.END)
+        self.output_text.config(state=tk.DISABLED)
         
-        # Start progress bar
-        self.progress.start()
+        # Start progress bar; it switches to percent done once the script
+        # reports the position of the final encode
+        self._progress_total = None if batch_file else self._vars["duration"].get()
+        self.progress.config(mode="indeterminate", value=0)
+        self.progress.start(PROGRESS_INTERVAL_MS)
         self.processing = True
         
-        # Run the command in a separate thread
-        thread = threading.Thread(target=self.run_command, args=(cmd,))
-        thread.daemon = True
-        thread.start()
+        # Run the command on the background event loop
+        asyncio.run_coroutine_threadsafe(self.run_command(cmd, batch_file), self.loop)
 
-    def run_command(self, cmd):
+    async def run_command(self, cmd, batch_file=None):
         try:
-            # Run the command and capture output
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
+            # Run the command; its output goes to the log as it is read
+            finished = self.loop.create_future()
+            transport, _ = await self.loop.subprocess_exec(
+                lambda: OutputProtocol(self.update_output, finished),
+                *cmd,
+                stdin=asyncio.subprocess.DEVNULL,
+                env=dict(os.environ, PYTHONUNBUFFERED="1"),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                **PROCESS_FLAGS
             )
             
-            # Read output line by line
-            for line in process.stdout:
-                self.update_output(line)
-            
             # Wait for process to complete
-            return_code = process.wait()
+            self._running.add(transport)
+            try:
+                await finished
+            finally:
+                self._running.discard(transport)
+            return_code = transport.get_returncode()
+            transport.close()
             
             # Show completion message
-            if return_code == 0:
+            if transport.get_pid() in self._cancelled:
+                self._cancelled.discard(transport.get_pid())
+                self.update_output("\n⏹ Cancelled\n")
+            elif return_code == 0:
                 self.update_output("\n✅ Video montage created successfully!\n")
-                messagebox.showinfo("Success", "Video montage created successfully!")
+                self.root.after(0, messagebox.showinfo, "Success", "Video montage created successfully!")
             else:
                 self.update_output(f"\n❌ Error: Process exited with code {return_code}\n")
-                messagebox.showerror("Error", f"Process exited with code {return_code}")
+                self.root.after(0, messagebox.showerror, "Error", f"Process exited with code {return_code}")
         
         except Exception as e:
             self.update_output(f"\n❌ Error: {str(e)}\n")
-            messagebox.showerror("Error", str(e))
+            self.root.after(0, messagebox.showerror, "Error", str(e))
         
         finally:
+            # The batch file is only needed while the script runs
+            if batch_file:
+                try:
+                    os.remove(batch_file)
+                except OSError:
+                    pass
+            
             # Stop progress bar
             self.root.after(0, self.stop_progress)
 
+    def cancel_run(self):
+        for transport in list(self._running):
+            if transport.get_returncode() is not None:
+                continue
+            self.update_output("\n⏹ Cancelling...\n")
+            pid = transport.get_pid()
+            self._cancelled.add(pid)
+            try:
+                if os.name == "nt":
+                    # Take the ffmpeg children down with the script
+                    subprocess.run(["taskkill", "/T", "/F", "/PID", str(pid)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                                   **PROCESS_FLAGS)
+                else:
+                    # SIGINT lets the script clean up its temp files
+                    os.killpg(pid, signal.SIGINT)
+            except OSError:
+                pass
+
     def update_output(self, text):
-        # Update the output text widget from the main thread
-        self.root.after(0, lambda: self.append_output(text))
+        # Collect output and update the text widget from the main thread,
+        # once per OUTPUT_FLUSH_MS instead of once per read
+        with self._output_lock:
+            self._pending_output.append(text)
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.root.after(OUTPUT_FLUSH_MS, self.flush_output)
+
+    def flush_output(self):
+        with self._output_lock:
+            text = "".join(self._pending_output)
+            self._pending_output.clear()
+            self._flush_scheduled = False
+        if text:
+            self.append_output(text)
+            self.update_progress(text)
+
+    def update_progress(self, text):
+        if not self._progress_total:
+            return
+        seconds = parse_ffmpeg_progress(text.encode())
+        if seconds < 0:
+            return
+        if str(self.progress["mode"]) != "determinate":
+            self.progress.stop()
+            self.progress.config(mode="determinate", maximum=self._progress_total)
+        self.progress["value"] = min(seconds, self._progress_total)
 
     def append_output(self, text):
+        self.output_text.config(state=tk.NORMAL)
         self.output_text.insert(tk.END, text)
+        
+        # Drop the oldest lines once the log is over the limit
+        line_count = int(self.output_text.index("end-1c").split(".")[0])
+        if line_count > MAX_OUTPUT_LINES:
+            self.output_text.delete("1.0", f"{line_count - MAX_OUTPUT_LINES}.0")
+        self.output_text.config(state=tk.DISABLED)
         self.output_text.see(tk.END)  # Scroll to the end
 
     def stop_progress(self):